@@ -0,0 +1,172 @@
+"""
+Benchmark of the galaxy generation, run without a display.
+
+For each galaxy size, every phase of the generation is timed on the whole galaxy
+(star placement, pathway rolls, union-find repair, links between sectors), followed by
+the exploration of star systems, surface rolls, the map star selection and route queries.
+Wall time, peak memory (tracemalloc) and counts are written as JSON, so that runs of two
+versions can be compared.
+
+Run it from anywhere:
+    python benchmarks/galaxy_benchmark.py --sizes 4 16 64 256 --output before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CALLER = os.getcwd()
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+os.chdir(ROOT)  # assets and database are found from the working directory
+
+import galaxy
+
+SIZES = [4, 8, 16, 32, 64, 128, 256, 512, 1024]
+
+
+def measure(phase, results, memory):
+    """
+    Decorate a phase: run it, store its wall time, peak memory and the counts it returns
+    """
+    def run(function):
+        if memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        counts = function() or {}
+        entry = {"seconds": time.perf_counter() - start}
+        if memory:
+            entry["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        entry.update(counts)
+        results[phase] = entry
+        print("  %-8s %9.3fs %s" % (phase, entry["seconds"], counts))
+        return function
+    return run
+
+
+def bench_size(size, args):
+    """
+    Generate a whole galaxy of the given size phase by phase, return the measures
+    """
+    results = {}
+    memory = not args.no_memory
+    gal = galaxy.Galaxy(size=size, seed=args.seed)
+    keys = list(gal.sector_keys(0, 0, size, size))
+    max_sectors = galaxy.MAX_SECTORS
+    galaxy.MAX_SECTORS = max(max_sectors, len(keys))  # keep everything, nothing is evicted
+    try:
+        sectors = []
+        rng = random.Random(args.seed)
+
+        @measure("place", results, memory)
+        def place():
+            sectors.extend(gal.placed_sector(key) for key in keys)
+            return {"sectors": len(sectors), "stars": sum(len(sector.stars) for sector in sectors)}
+
+        @measure("roll", results, memory)
+        def roll():
+            for sector in sectors:
+                gal.roll_pathways(sector)
+            return {"pathways": sum(len(row) for sector in sectors for row in sector.way) // 2}
+
+        @measure("repair", results, memory)
+        def repair():
+            return {"pathways_added": sum(gal.connect(sector) for sector in sectors)}
+
+        @measure("link", results, memory)
+        def link():
+            for sector in sectors:
+                gal.link_neighbours(sector)
+            return {"pathways": sum(len(row) for sector in sectors for row in sector.way) // 2}
+
+        stars = [star for sector in sectors for star in sector.stars]
+        sample = rng.sample(stars, min(len(stars), args.explore_limit))
+
+        @measure("explore", results, memory)
+        def explore():
+            for star in sample:
+                star.explore()
+            return {"stars": len(sample), "objects": sum(len(star.objects) for star in sample)}
+
+        # as many surfaces as the whole galaxy would have once explored
+        types = [obj.type for star in sample for obj in star.objects if obj.type in galaxy.SURFACES]
+        total = len(types) * len(stars) // max(1, len(sample))
+        types = (types * (total // max(1, len(types)) + 1))[:total]
+
+        @measure("surfaces", results, memory)
+        def surfaces():
+            sizes, _, codes = galaxy.roll_surfaces(types, galaxy.surface_seeds(args.seed, len(types)))
+            return {"objects": len(sizes), "squares": len(codes), "numpy": galaxy.np is not None}
+
+        @measure("visible", results, memory)
+        def visible():
+            gal.camera_pos = [0, 0]
+            gal.current_zoom = min(size, galaxy.MAX_VIEW)
+            for _ in range(args.repeat):
+                gal.select_visible_star()
+            return {"calls": args.repeat, "stars": len(gal.visible_stars), "pathways": len(gal.vs_way)}
+
+        pairs = [(rng.choice(stars), rng.choice(stars)) for _ in range(args.repeat)]
+
+        @measure("route", results, memory)
+        def route():
+            routes = [gal.find_route(src, dst) for src, dst in pairs]
+            return {"queries": len(pairs), "found": sum(route is not None for route in routes),
+                    "hops": sum(len(route) - 1 for route in routes if route)}
+
+        return results
+    finally:
+        # the next sizes, and whatever runs in the same process, get the setting back
+        galaxy.MAX_SECTORS = max_sectors
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="galaxy sizes to sweep")
+    parser.add_argument("--seed", type=int, default=0, help="galaxy seed")
+    parser.add_argument("--explore-limit", type=int, default=2000, help="most stars explored per size")
+    parser.add_argument("--repeat", type=int, default=20, help="map selections and route queries per size")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc, which slows everything down")
+    parser.add_argument("--output", default="galaxy_benchmark.json", help="where to write the JSON results")
+    args = parser.parse_args()
+    output = os.path.join(CALLER, args.output)
+
+    # the galaxy prints its progress, keep the benchmark output readable
+    galaxy.print = lambda *objects, **kwargs: None
+    if not args.no_memory:
+        tracemalloc.start()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "memory": not args.no_memory,
+        "results": [],
+    }
+    for size in args.sizes:
+        print("size", size)
+        report["results"].append({"size": size, "phases": bench_size(size, args)})
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+    print("written to", output)
+
+
+if __name__ == "__main__":
+    main()
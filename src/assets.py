@@ -0,0 +1,182 @@
+"""
+Assets class for loading the images once and sharing them
+"""
+
+import os
+import pygame as pg
+import logging
+import threading
+
+# images read in the background at startup, relative to the images folder of the assets
+# (the starfields of the intro are picked at random and too big to read them all)
+PRELOAD_IMAGES = [
+    os.path.join('UI', 'frame_map.png'),
+    os.path.join('UI', 'background_menu.png'),
+    os.path.join('UI', 'square_A.png'),
+    os.path.join('UI', 'square_I.png'),
+    os.path.join('UI', 'left.png'),
+    os.path.join('UI', 'right.png'),
+    os.path.join('UI', 'back.png'),
+    'Player_sprite.png',
+    'Asteroid.png',
+    'GasGiant1.png',
+    'GasGiant2.png',
+    'IcyGiant1.png',
+    'IcyGiant2.png',
+    'Rocky1.png',
+    'Rocky2.png',
+    'Rocky3.png',
+    'Rocky4.png',
+    'Rocky5.png',
+    'Rocky6.png',
+]
+# sprite sheets read in the background at startup
+PRELOAD_SHEETS = [
+    os.path.join('sprite_sheet', 'inventory.png'),
+]
+
+class Assets:
+    """
+    Assets class for loading images: each file is read from disk and converted once,
+    then handed out as a copy, or shared when the caller never draws on it.
+    A preloader thread can read the files ahead of time, they are converted on first use
+    (converting needs the display, which belongs to the main thread)
+    """
+    def __init__(self):
+        self.images = {}
+        self.sheets = {}
+        # files read by the preloader, not converted yet
+        self.files = {}
+        # files the main thread took (from files or from disk), the preloader skips them
+        self.taken = set()
+        # held by the preloader while it reads a file, and to look at files and taken
+        self.lock = threading.Lock()
+        self.preloader = None
+        self.hits = 0
+        self.misses = 0
+
+    def preload(self, images=(), sheets=(), tasks=()):
+        """
+        Read image files in a background thread, then run the tasks there
+
+        images: paths to the image files, converted when first used
+        sheets: paths to the sprite sheets
+        tasks: functions called without arguments once the files are read
+        """
+        self.preloader = threading.Thread(
+            target=self.read_files, args=(list(images) + list(sheets), list(tasks)), daemon=True)
+        self.preloader.start()
+
+    def read_files(self, paths, tasks):
+        """
+        Body of the preloader thread
+
+        paths: paths to the files to read
+        tasks: functions to call afterwards
+        """
+        for path in paths:
+            # the main thread waits for the file being read instead of reading it twice
+            with self.lock:
+                if path in self.taken or path in self.files:
+                    continue
+                try:
+                    self.files[path] = pg.image.load(path)
+                except (pg.error, OSError):
+                    logging.warning("Could not preload %s", path)
+        for task in tasks:
+            task()
+
+    def loading(self):
+        """
+        Whether the preloader is still running
+        """
+        return self.preloader is not None and self.preloader.is_alive()
+
+    def wait(self):
+        """
+        Wait until the preloader is done
+        """
+        if self.preloader is not None:
+            self.preloader.join()
+            self.preloader = None
+
+    def read(self, path):
+        """
+        Get the surface of a file, as read by the preloader or from disk
+
+        path: path to the image file
+        """
+        with self.lock:
+            self.taken.add(path)
+            image = self.files.pop(path, None)
+        if image is None:
+            image = pg.image.load(path)
+        return image
+
+    def load_image(self, path):
+        """
+        Load and convert an image file, with black as transparent color, return the cached
+        surface (itself, not a copy) if it is already loaded
+
+        path: path to the image file
+        """
+        if path in self.images:
+            return self.images[path]
+        self.misses += 1
+        image = self.read(path).convert_alpha()
+        image.set_colorkey((0,0,0))
+        self.images[path] = image
+        return image
+
+    def image(self, path, shared=False):
+        """
+        Get a converted image
+
+        path: path to the image file
+        shared: return the cached surface itself, which must then be left untouched
+        """
+        if path in self.images:
+            self.hits += 1
+        image = self.load_image(path)
+        return image if shared else image.copy()
+
+    def sheet(self, path):
+        """
+        Get an image as stored in the file (not converted), shared: cut it with subsurface
+
+        path: path to the image file
+        """
+        if path in self.sheets:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.sheets[path] = self.read(path)
+        return self.sheets[path]
+
+    def release(self, *paths):
+        """
+        Forget images used for a while only, e.g. the large ones of a state being left:
+        the surfaces are freed once the sprites showing them are gone
+
+        paths: paths to the image files
+        """
+        for path in paths:
+            self.images.pop(path, None)
+
+    def memory(self):
+        """
+        Bytes of pixel data held by the cached surfaces
+        """
+        with self.lock:
+            return sum(image.get_pitch()*image.get_height()
+                       for cache in (self.images, self.sheets, self.files) for image in cache.values())
+
+    def clear(self):
+        """
+        Forget all the images
+        """
+        self.wait()
+        self.images.clear()
+        self.sheets.clear()
+        self.files.clear()
+        self.taken.clear()
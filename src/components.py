@@ -6,6 +6,18 @@ import pygame as pg
 import os
 import sys
 import math 
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:  # the pathways are then clipped and dashed in pure Python
+    np = None
+
+FONT_CACHE_SIZE = 32  # font objects kept alive, one per (path, size)
+SLICE_CACHE_SIZE = 128  # nine-sliced surfaces kept, one per (image, borders, size, mode)
+ATLAS_CACHE_SIZE = 16  # glyph atlases kept, one per (path, size, color)
+LAYOUT_CACHE_SIZE = 32  # paragraphs kept, one per (text, atlas, width)
+GLYPHS = ''.join(map(chr, range(32, 127)))  # rasterized up front, other characters on first use
 
 def ressource_path():
     try:
@@ -15,14 +27,291 @@ def ressource_path():
 
     return os.path.join(base_path, "assets")
 
-class CustomSprite(pg.sprite.Sprite):
+class FontCache:
+    """
+    Process-wide registry of font objects keyed by (path, size), least recently used evicted.
+    Building a pg.font.Font opens and parses the font file, so it is done once per key.
+    """
+    def __init__(self, max_size=FONT_CACHE_SIZE):
+        self.max_size = max_size
+        self.fonts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, size):
+        """
+        Get the font object of the given file and size
+        """
+        key = (path, size)
+        font = self.fonts.get(key)
+        if font is not None:
+            self.hits += 1
+            self.fonts.move_to_end(key)
+            return font
+        self.misses += 1
+        font = self.fonts[key] = pg.font.Font(path, size)
+        if len(self.fonts) > self.max_size:
+            self.fonts.popitem(last=False)
+        return font
+
+    def clear(self):
+        self.fonts.clear()
+        self.hits = self.misses = 0
+
+font_cache = FontCache()
+
+class SliceCache:
+    """
+    Nine-sliced surfaces keyed by source image, borders, target size and draw mode,
+    least recently used evicted. The source images are the shared surfaces of the assets.
+    """
+    def __init__(self, max_size=SLICE_CACHE_SIZE):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sprite, left, right, top, bottom, width, height, draw_mode):
+        """
+        Get a copy of the sliced surface, rendering it on a miss
+        """
+        key = (sprite, left, right, top, bottom, width, height, draw_mode)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+        else:
+            self.misses += 1
+            surface = self.surfaces[key] = render_slices(sprite, left, right, top, bottom, width, height, draw_mode)
+            if len(self.surfaces) > self.max_size:
+                self.surfaces.popitem(last=False)
+        return surface.copy()
+
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = self.misses = 0
+
+slice_cache = SliceCache()
+
+class GlyphAtlas:
+    """
+    The glyphs of a monospaced font, rasterized once in one surface for a size and a color.
+    Text is measured with arithmetic and drawn with a single Surface.blits from the atlas rects.
+    """
+    atlases = OrderedDict()  # (path, size, color) -> atlas, least recently used evicted
+
+    def __init__(self, path, size, color):
+        self.font = font_cache.get(path, size)
+        self.color = color
+        self.advance = self.font.size(' ')[0]
+        self.rects = {}
+        self.build(GLYPHS)
+
+    @classmethod
+    def get(cls, path, size, color=(255,255,255)):
+        """
+        Get the atlas of the given font file, size and color
+        """
+        key = (path, size, tuple(pg.Color(color)))
+        atlas = cls.atlases.get(key)
+        if atlas is None:
+            atlas = cls.atlases[key] = cls(path, size, color)
+            if len(cls.atlases) > ATLAS_CACHE_SIZE:
+                cls.atlases.popitem(last=False)
+        else:
+            cls.atlases.move_to_end(key)
+        return atlas
+
+    def build(self, glyphs):
+        """
+        Rasterize the glyphs, with the ones already in the atlas, in a new atlas surface.
+        The font is monospaced: the glyph k of the line starts at k*advance.
+        """
+        glyphs = ''.join(self.rects) + ''.join(ch for ch in dict.fromkeys(glyphs) if ch not in self.rects)
+        # rendered as one line, so that every glyph sits on the same baseline
+        self.image = self.font.render(glyphs, False, self.color).convert_alpha()
+        self.height = self.image.get_height()
+        for k, ch in enumerate(glyphs):
+            self.rects[ch] = pg.Rect(k*self.advance, 0, self.advance, self.height)
+
+    def size(self, text):
+        return len(text)*self.advance, self.height
+
+    def blit(self, surface, text, pos):
+        """
+        Draw a line of text on the surface, its top left corner at pos
+        """
+        missing = [ch for ch in text if ch not in self.rects]
+        if missing:
+            self.build(missing)
+        x, y = pos
+        surface.blits([(self.image, (x + k*self.advance, y), self.rects[ch])
+                       for k, ch in enumerate(text) if ch != ' '], doreturn=False)
+
+class TextLayout:
+    """
+    A paragraph wrapped once at a width and drawn once on its own surface,
+    shown afterwards with a single blit, scrolled by a number of lines
+    """
+    layouts = OrderedDict()  # (text, atlas, width) -> layout, least recently used evicted
+
+    def __init__(self, text, atlas, width):
+        self.atlas = atlas
+        self.lines = []
+        for line in text.splitlines():
+            row, x = [], 0
+            for word in line.split(' '):
+                word_width = len(word)*atlas.advance
+                if row and x + word_width >= width:
+                    self.lines.append(' '.join(row))
+                    row, x = [], 0
+                row.append(word)
+                x += word_width + atlas.advance
+            self.lines.append(' '.join(row))
+        self.line_height = atlas.height*1.1
+        self.image = pg.Surface((max(1, width), math.ceil(len(self.lines)*self.line_height)), pg.SRCALPHA)
+        for k, line in enumerate(self.lines):
+            atlas.blit(self.image, line, (0, k*self.line_height))
+
+    @classmethod
+    def get(cls, text, atlas, width):
+        """
+        Get the layout of the text wrapped at the given width
+        """
+        key = (text, atlas, width)
+        layout = cls.layouts.get(key)
+        if layout is None:
+            layout = cls.layouts[key] = cls(text, atlas, width)
+            if len(cls.layouts) > LAYOUT_CACHE_SIZE:
+                cls.layouts.popitem(last=False)
+        else:
+            cls.layouts.move_to_end(key)
+        return layout
+
+    def visible_lines(self, height):
+        return max(1, math.floor(height / self.line_height))
+
+    def max_offset(self, height):
+        """
+        Largest scroll offset, in lines, for a view of the given height
+        """
+        return max(0, len(self.lines) - self.visible_lines(height))
+
+    def blit(self, surface, pos, offset=0):
+        """
+        Draw the lines from offset on that fit in the surface, the first one at pos
+        """
+        height = surface.get_height() - pos[1]
+        offset = min(max(0, offset), self.max_offset(height))
+        top = round(offset*self.line_height)
+        area = pg.Rect(0, top, self.image.get_width(), self.visible_lines(height)*self.line_height)
+        surface.blit(self.image, pos, area)
+
+class SpriteGroup(pg.sprite.Group):
+    """
+    Sprite group counting the changes of its sprites (version), so that what is built
+    from its content, such as a HitGrid, knows when to build it again
+    """
+    def __init__(self, *sprites):
+        self.version = 0
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        self.version += 1
+        super().add_internal(sprite)
+
+    def remove_internal(self, sprite):
+        self.version += 1
+        super().remove_internal(sprite)
+
+class TaggedGroup(SpriteGroup):
+    """
+    Sprite group keeping its sprites by tag, to find or remove the sprites of a tag without
+    going through the others, and drawing the tags by layer (the lowest first, 0 by default).
+    A sprite is filed under the tag it has when added: give it another tag only out of the group.
+    """
+    def __init__(self, *sprites):
+        self.by_tag = {}  # tag -> {sprite: None}, in the order they were added
+        self.tag_of = {}
+        self.layers = {}
+        self.order = None  # sprites sorted by layer, None until needed
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite)
+        tag = getattr(sprite, 'tag', None)
+        self.tag_of[sprite] = tag
+        self.by_tag.setdefault(tag, {})[sprite] = None
+        self.order = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        tag = self.tag_of.pop(sprite)
+        del self.by_tag[tag][sprite]
+        if not self.by_tag[tag]:
+            del self.by_tag[tag]
+        self.order = None
+
+    def tagged(self, tag):
+        """
+        The sprites with this tag
+        """
+        return list(self.by_tag.get(tag, ()))
+
+    def remove_tags(self, *tags):
+        """
+        Remove the sprites with any of these tags
+        """
+        for tag in tags:
+            if tag in self.by_tag:
+                self.remove(*self.by_tag[tag])
+
+    def set_layer(self, tag, layer):
+        """
+        Draw the sprites with this tag over the ones of lower layers
+        """
+        self.layers[tag] = layer
+        self.order = None
+
+    def sprites(self):
+        if not self.layers:
+            return super().sprites()
+        if self.order is None:
+            self.order = sorted(super().sprites(), key=lambda sprite: self.layers.get(self.tag_of[sprite], 0))
+        return list(self.order)
+
+class HitGrid:
+    """
+    Uniform grid of rects to find what is under a point without testing every rect
+    """
+    def __init__(self, items, cell=64):
+        """
+        items: (rect, item) pairs, the last ones on top
+        cell: size of the cells of the grid, in pixels
+        """
+        self.cell = cell
+        self.cells = {}
+        for order, (rect, item) in enumerate(items):
+            for cx in range(rect.left // cell, (rect.right - 1) // cell + 1):
+                for cy in range(rect.top // cell, (rect.bottom - 1) // cell + 1):
+                    self.cells.setdefault((cx, cy), []).append((order, rect, item))
+
+    def at(self, pos):
+        """
+        The item on top at pos, or None
+        """
+        hits = [(order, item) for order, rect, item in self.cells.get((pos[0] // self.cell, pos[1] // self.cell), ())
+                if rect.collidepoint(pos)]
+        return max(hits, key=lambda hit: hit[0])[1] if hits else None
+
+class CustomSprite(pg.sprite.DirtySprite):
     
     def generate_frame(self, Background = False):
         assets_dir = ressource_path()
         if Background == False:
-            frame = ImageSprite(self.game, os.path.join(assets_dir, 'images','UI', 'frame_map.png'))
+            frame = ImageSprite(self.game, os.path.join(assets_dir, 'images','UI', 'frame_map.png'), shared=True)
         elif Background == True:
-            frame = ImageSprite(self.game, os.path.join(assets_dir, 'images','UI','background_menu.png'))
+            frame = ImageSprite(self.game, os.path.join(assets_dir, 'images','UI','background_menu.png'), shared=True)
         size = (self.image.get_width() + 32,self.image.get_height() + 32)
         frame.image = slice_sprite(frame.image, 32, 32, 27, 38, size[0],size[1])    
         frame.rect = frame.image.get_rect()
@@ -34,11 +323,10 @@ class CustomSprite(pg.sprite.Sprite):
         assets_dir = ressource_path()
         if active == True:
             square = ImageSprite(self.game, os.path.join(
-                assets_dir, 'images', 'UI', 'square_A.png'),tag="activated")
+                assets_dir, 'images', 'UI', 'square_A.png'),tag="activated",shared=True)
         else:
             square = ImageSprite(self.game, os.path.join(
-                assets_dir, 'images', 'UI', 'square_I.png'))
-        square.image.convert_alpha()
+                assets_dir, 'images', 'UI', 'square_I.png'),shared=True)
         size = self.rect.size
         square.image = slice_sprite(square.image, 7, 7, 1, 7, size[0], size[1])
         square.rect = square.image.get_rect()
@@ -51,18 +339,17 @@ class ImageSprite(CustomSprite):
     """
     Sprite class for loading and displaying images
     """
-    def __init__(self, game, path,tag=''):
+    def __init__(self, game, path,tag='',shared=False):
         """
         game: game object
         path: path to the image file
+        shared: use the cached image itself, for sprites that replace their image instead of drawing on it
         """
 
         super().__init__()
         self.game = game
-        # load the image
-        self.image = pg.image.load(path).convert_alpha()
-        # set the colorkey to black
-        self.image.set_colorkey((0,0,0))
+        # get the image, converted with black as colorkey, from the assets
+        self.image = game.assets.image(path, shared)
         # get the rect
         self.rect = self.image.get_rect()
         self.tag = tag
@@ -88,7 +375,7 @@ class ShapeSprite(CustomSprite):
         self.rect = self.image.get_rect() 
         self.tag = tag
     
-class TextSprite(pg.sprite.Sprite):
+class TextSprite(pg.sprite.DirtySprite):
     """
     Sprite class for displaying text
     """
@@ -124,7 +411,7 @@ class TextSprite(pg.sprite.Sprite):
         """
         Get the font object with the given size
         """
-        return pg.font.Font(self.font_path, size)
+        return font_cache.get(self.font_path, size)
 
     def make_button(self, size):
         shape = ShapeSprite(self.game,'rect',size=size)
@@ -135,49 +422,118 @@ class TextSprite(pg.sprite.Sprite):
         self.rect = button_bg.image.get_rect()
         
 class MapSprite(CustomSprite):
-    def __init__(self, game, map_bg):
+    """
+    Sprite of the galaxy map, composed of layers drawn on their own surfaces:
+        pathways and stars: redrawn only when the camera or the zoom changes
+        marker: the current position of the player, redrawn when the player moves
+        overlays: the route to the destination of the player, if any, as searched by Memory.set_destination
+    The layers are shared by the map sprites of all the states.
+    """
+    LAYERS = ("pathways", "stars", "marker", "overlays")
+    layers = {}  # layer name -> (key it was drawn for, surface)
+    view = None  # camera view the positions on the map were computed for
+    positions = {}  # visible star -> its position on the map
+
+    def __init__(self, game, map_bg, draw=True):
+        """
+        game: game object
+        map_bg: sprite of the frame of the map
+        draw: draw the map now, else it is empty until drawn (see drawing_map)
+        """
         super().__init__()
         self.game = game
         self.rect = map_bg.rect.copy()
         self.rect.h = map_bg.rect.w
-        self.draw_map()
+        self.keys = None
+        self.image = pg.Surface(self.rect.size, pg.SRCALPHA)
+        if draw:
+            self.draw_map()
         self.tag = "map overlay"
 
+    def update(self):
+        self.draw_map()
+
     def draw_map(self):
-        surface = pg.Surface(self.rect.size, pg.SRCALPHA)
-        camera_pos = self.game.memory.Galaxy.camera_pos
-        starSprite = TextSprite(self.game, os.path.join(ressource_path(), 'fonts', 'PressStart2P-Regular.ttf'), "*", 10, color = (255,255,255))
-        CurStarSprite = TextSprite(self.game, os.path.join(ressource_path(), 'fonts', 'PressStart2P-Regular.ttf'), "[*]", 10, color = (255,255,255))
-
-        ind = 0
-        self.game.memory.Galaxy.select_visible_star()
-        PrevStars = []
-        print(self.game.memory.Galaxy.visible_stars)
-        for star in self.game.memory.Galaxy.stars.values():
-            if self.game.memory.Galaxy.visible_stars[ind]:
-                pos = [(star.coordinates[0] - self.game.memory.Galaxy.camera_pos[0])*(self.rect.w/self.game.memory.Galaxy.current_zoom), (star.coordinates[1] - self.game.memory.Galaxy.camera_pos[1])*(self.rect.w/self.game.memory.Galaxy.current_zoom)]
-                if star != self.game.memory.Player["System"]:
-                    printpos = [pos[0] - starSprite.rect.w/2, pos[1] - starSprite.rect.h/2]
-                    surface.blit(starSprite.image, printpos, special_flags=pg.BLEND_PREMULTIPLIED)
-                else:
-                    printpos = [pos[0] - CurStarSprite.rect.w/2, pos[1] - CurStarSprite.rect.h/2]
-                    surface.blit(CurStarSprite.image, printpos, special_flags=pg.BLEND_PREMULTIPLIED)
-                PrevStars.append(star)
-                for i in range(0, ind):
-                    if self.game.memory.Galaxy.vs_way[ind][i]:
-                        pos2 = [(PrevStars[i].coordinates[0] - self.game.memory.Galaxy.camera_pos[0])*(self.rect.w/self.game.memory.Galaxy.current_zoom), (PrevStars[i].coordinates[1] - self.game.memory.Galaxy.camera_pos[1])*(self.rect.w/self.game.memory.Galaxy.current_zoom)]
-                        #pg.draw.line(surface, "White", pos,pos2)
-                        draw_dashed_line(surface, "White", pos, pos2, 0)
-            ind += 1
-
-        self.image = surface
+        """
+        Redraw the layers that are out of date, then compose the map if any was
+        """
+        for progress in self.drawing_map():
+            pass
+
+    def drawing_map(self):
+        """
+        Same as draw_map, as a generator yielding its progress (0 to 1) after each step,
+        so that the map can be drawn over several frames
+        """
+        galaxy = self.game.memory.Galaxy
+        # a new pathway shows as a change of view: the visible stars are selected again with their pathways
+        view = (id(galaxy), galaxy.pathway_version, tuple(galaxy.camera_pos), galaxy.current_zoom, self.rect.size)
+        route = tuple(self.game.memory.Player.get("Route") or ())
+        keys = {"pathways": view, "stars": view,
+                "marker": (view, self.game.memory.Player.get("System")),
+                "overlays": (view, route)}
+        if keys == self.keys:
+            return
+        stale = [name for name in self.LAYERS if self.layers.get(name, (None,))[0] != keys[name]]
+        steps = len(stale) + 2
+        if MapSprite.view != view:
+            galaxy.select_visible_star()
+            scale = self.rect.w/galaxy.current_zoom
+            camera_x, camera_y = galaxy.camera_pos
+            MapSprite.positions = {star: ((star.coordinates[0] - camera_x)*scale, (star.coordinates[1] - camera_y)*scale)
+                                   for star in galaxy.visible_stars}
+            MapSprite.view = view
+            yield 1/steps
+        for n, name in enumerate(stale):
+            surface = pg.Surface(self.rect.size, pg.SRCALPHA)
+            getattr(self, "draw_" + name)(surface, galaxy)
+            self.layers[name] = (keys[name], surface)
+            yield (n + 2)/steps
+
+        self.image = pg.Surface(self.rect.size, pg.SRCALPHA)
+        self.image.blits([(self.layers[name][1], (0, 0)) for name in self.LAYERS], doreturn=False)
+        self.keys = keys
+        yield 1
+
+    def star_sprite(self, text):
+        return TextSprite(self.game, os.path.join(ressource_path(), 'fonts', 'PressStart2P-Regular.ttf'), text, 10, color = (255,255,255))
+
+    def draw_pathways(self, surface, galaxy):
+        positions = [self.positions[star] for star in galaxy.visible_stars]
+        draw_dashed_pathways(surface, "White", [(positions[j], positions[i]) for i, j in galaxy.vs_way])
+
+    def draw_stars(self, surface, galaxy):
+        star = self.star_sprite("*")
+        half_w, half_h = star.rect.w/2, star.rect.h/2
+        surface.blits([(star.image, (x - half_w, y - half_h), None, pg.BLEND_PREMULTIPLIED)
+                       for x, y in self.positions.values()], doreturn=False)
+
+    def draw_marker(self, surface, galaxy):
+        system = self.game.memory.Player.get("System")
+        if system in self.positions:
+            marker = self.star_sprite("[*]")
+            x, y = self.positions[system]
+            surface.blit(marker.image, (x - marker.rect.w/2, y - marker.rect.h/2), special_flags=pg.BLEND_PREMULTIPLIED)
+
+    def draw_overlays(self, surface, galaxy):
+        # the stored route: no route search while drawing
+        route = self.game.memory.Player.get("Route") or []
+        points = [self.positions[star] for star in route if star in self.positions]
+        if len(points) > 1:
+            pg.draw.lines(surface, "Yellow", False, points)
         
     
 
 
+def slice_sprite(sprite, left, right, top, bottom, width, height, draw_mode="SLICED"):
+    """
+    Nine-slice the sprite to the given size, memoized: the result is a copy the caller may draw on
+    """
+    return slice_cache.get(sprite, left, right, top, bottom, width, height, draw_mode)
+
 #From Kokoko @stackoverflow
 
-def slice_sprite(sprite, left, right, top, bottom, width, height, draw_mode="SLICED"):
+def render_slices(sprite, left, right, top, bottom, width, height, draw_mode="SLICED"):
     # get the size of the sprite
     sprite_width = sprite.get_width()
     sprite_height= sprite.get_height()
@@ -258,7 +614,7 @@ def slice_sprite(sprite, left, right, top, bottom, width, height, draw_mode="SLI
 
 def make_arrow(game, direction, size):
     assets_dir = ressource_path()
-    button = ImageSprite(game, os.path.join(assets_dir, 'images', 'UI', direction+'.png'), tag=direction)
+    button = ImageSprite(game, os.path.join(assets_dir, 'images', 'UI', direction+'.png'), tag=direction, shared=True)
     button.image = slice_sprite(button.image, 34, 34, 29, 39, 1.5*size[0],1.5*size[1])
     button.image.set_colorkey((0,0,0))
     button.rect = button.image.get_rect()
@@ -266,41 +622,22 @@ def make_arrow(game, direction, size):
 
 
 #Adapted from galatolofederico @Github 
-def blit_text(surface, text, pos, font, color=pg.Color('white')):
-    words = [word.split(' ') for word in text.splitlines()] 
-    space = font.size(' ')[0]
-    max_width, max_height = surface.get_width(), surface.get_height()
-    x, y = pos
-    rects = []
-    row_rects = []
-    for line in words:
-        for word in line:
-            word_surface = font.render(word, 0, color)
-            word_width, word_height = word_surface.get_size()
-            if x + word_width >= max_width:
-                x = pos[0]
-                rects.append(row_rects)
-                row_rects = []
-            row_rects.append(word)
-            x += word_width + space
-        x = pos[0]
-        rects.append(row_rects)
-        row_rects = []
-
-    max_vertical_rects = math.floor(max_height / font.size(' ')[1])
-    printable_rects = rects[-max_vertical_rects:]
-    for line in printable_rects:
-        for word in line:
-            word_surface = font.render(word, 0, color)
-            word_width, word_height = word_surface.get_size()
-            surface.blit(word_surface, (x, y))
-            x += word_width + space
-        x = pos[0]
-        y += word_height*1.1
+def blit_text(surface, text, pos, atlas, offset=0):
+    """
+    Draw a text wrapped at the width of the surface, scrolled down by offset lines
+
+    atlas: GlyphAtlas of the font, size and color of the text
+    """
+    layout = TextLayout.get(text, atlas, surface.get_width() - pos[0])
+    layout.blit(surface, pos, offset)
+    return layout
  
 
 #Adapted from Rabbid76 @ StackOverflow
 def draw_dashed_line(surf, color, p1, p2, prev_line_len, dash_length=8):
+    """
+    Draw a dashed line from p1 to p2, continuing the dash pattern of a line of length prev_line_len
+    """
     dx, dy = p2[0]-p1[0], p2[1]-p1[1]
     if dx == 0 and dy == 0:
         return 
@@ -311,20 +648,96 @@ def draw_dashed_line(surf, color, p1, p2, prev_line_len, dash_length=8):
     step = dash_length*2
     start = (int(prev_line_len) // step) * step
     end = (int(prev_line_len + dist) // step + 1) * step
-    for i in range(start, end, dash_length*2):
-        s = max(0, start - prev_line_len + i)
-        e = min(start - prev_line_len + dash_length + i, dist)
+    for i in range(start, end, step):
+        s = max(0, i - prev_line_len)
+        e = min(i - prev_line_len + dash_length, dist)
         if s < e:
             ps = p1[0] + dx * s, p1[1] + dy * s 
             pe = p1[0] + dx * e, p1[1] + dy * e 
             pg.draw.line(surf, color, pe, ps)
 
 
-def draw_dashed_lines(surf, color, points, dash_length=8):
-    p1, p2 = points[0], points[1]
-    line_len = 0
-    dist = dash_length*2
-    while line_len < math.hypot(points[0][0] - points[1][0],points[0][1]-points[1][1]):
-        print(math.hypot(p1[0] - p2[0],p1[1]-p2[1]), line_len)
-        draw_dashed_line(surf, color, p1, p2, line_len, dash_length)
-        line_len += dist
\ No newline at end of file
+def clip_segment(p1, p2, width, height):
+    """
+    Liang-Barsky: the part of the segment p1 p2 inside [0, width-1] x [0, height-1],
+    as the parameters (t0, t1) along the segment, or None if it is outside
+    """
+    t0, t1 = 0.0, 1.0
+    dx, dy = p2[0] - p1[0], p2[1] - p1[1]
+    for p, q in ((-dx, p1[0]), (dx, width - 1 - p1[0]), (-dy, p1[1]), (dy, height - 1 - p1[1])):
+        if p == 0:
+            if q < 0:
+                return None
+        elif p < 0:
+            t0 = max(t0, q/p)
+        else:
+            t1 = min(t1, q/p)
+    return (t0, t1) if t0 < t1 else None
+
+
+def draw_dashed_pathways(surf, color, segments, dash_length=8):
+    """
+    Draw many dashed lines at once, each clipped to the surface, the dashes starting at its first point.
+    With NumPy the clipping, the dashes and their pixels are computed for all the segments in one pass
+    and written to the surface in bulk, otherwise the clipped part of every segment is drawn by draw_dashed_line.
+
+    segments: list of (p1, p2)
+    """
+    width, height = surf.get_size()
+    step = dash_length*2
+    if np is None or not segments or surf.get_bytesize() != 4:
+        for p1, p2 in segments:
+            clip = clip_segment(p1, p2, width, height)
+            if clip is None:
+                continue
+            t0, t1 = clip
+            dx, dy = p2[0]-p1[0], p2[1]-p1[1]
+            # the dashes of the clipped part still start from p1
+            draw_dashed_line(surf, color, (p1[0] + dx*t0, p1[1] + dy*t0), (p1[0] + dx*t1, p1[1] + dy*t1),
+                             t0*math.hypot(dx, dy), dash_length)
+        return
+
+    p1, p2 = np.array(segments, dtype=float).transpose(1, 0, 2)
+    delta = p2 - p1
+    dist = np.hypot(delta[:, 0], delta[:, 1])
+    keep = dist > 0
+    p1, delta, dist = p1[keep], delta[keep], dist[keep]
+
+    # Liang-Barsky on every segment at once
+    t0, t1 = np.zeros(len(dist)), np.ones(len(dist))
+    inside = np.ones(len(dist), dtype=bool)
+    limits = np.array([width - 1, height - 1], dtype=float)
+    for axis in (0, 1):
+        for p, q in ((-delta[:, axis], p1[:, axis]), (delta[:, axis], limits[axis] - p1[:, axis])):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                r = q/p
+            inside &= (p != 0) | (q >= 0)
+            t0 = np.where(p < 0, np.maximum(t0, r), t0)
+            t1 = np.where(p > 0, np.minimum(t1, r), t1)
+    inside &= t0 < t1
+    p1, delta, dist, t0, t1 = p1[inside], delta[inside], dist[inside], t0[inside], t1[inside]
+
+    # the dashes of every segment, as distances from its first point
+    first = np.floor(t0*dist/step).astype(int)
+    counts = np.floor(t1*dist/step).astype(int) - first + 1
+    owner = np.repeat(np.arange(len(dist)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + first[owner]
+    s = np.maximum(k*step, t0[owner]*dist[owner])
+    e = np.minimum(k*step + dash_length, t1[owner]*dist[owner])
+    dash = s < e
+    owner, s, e = owner[dash], s[dash], e[dash]
+    direction = delta[owner]/dist[owner, None]
+    start = p1[owner] + direction*s[:, None]
+    end = p1[owner] + direction*e[:, None]
+
+    # the pixels of every dash, one per step along its major axis, like pg.draw.line between the floored ends
+    start, end = np.floor(start), np.floor(end)
+    pixels = np.abs(end - start).max(axis=1).astype(int) + 1
+    dash = np.repeat(np.arange(len(pixels)), pixels)
+    t = (np.arange(pixels.sum()) - np.repeat(np.cumsum(pixels) - pixels, pixels))/np.maximum(pixels - 1, 1)[dash]
+    points = np.rint(start[dash] + (end - start)[dash]*t[:, None]).astype(int)
+    points = points[(points[:, 0] >= 0) & (points[:, 0] < width) & (points[:, 1] >= 0) & (points[:, 1] < height)]
+
+    target = pg.surfarray.pixels2d(surf)
+    target[points[:, 0], points[:, 1]] = surf.map_rgb(pg.Color(color)) & 0xFFFFFFFF  # mapped as a signed int
+    del target  # unlock the surface
@@ -11,7 +11,7 @@ class Event:
         self.number = 0
         self.reference = ""
         self.choice = {}
-        self.LastEvent = pg.time.get_ticks()
+        self.elapsed = 0 # simulated time since the last event, in ms
         
     def event_exit(self):
         self.reset_event()
@@ -2,21 +2,402 @@
 This file contains all definition related to the game map, its generation and its updates.
 
 The Galaxy class contains all the data of the galaxy map.
+The map is split in sectors, generated from the galaxy seed only when something looks at them.
 
 The Galaxy class has the following methods:
-    generate: generate a map
-    update_object: update an object in the map
+    sector: get a sector, generating it if needed
+    star: get a star from its id
+    explore_many: populate many star systems at once, on all cores
+    neighbours: list the stars a star has a pathway to
+    stars_in, stars_within, nearest_stars: spatial queries on the stars
+    select_visible_star: list the stars and pathways in the camera view
 
 The Galaxy class has the following attributes:
-    stars: list containing all the stars on the map.
-    way: list of all the interstellar pathways.
+    seed: the seed every sector is generated from.
+    names: the pool of the star names, which hands them out to the sectors.
+    sectors: the sectors currently in memory, by (sx, sy).
 """
 
 import random
 import os
 import math
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappush, heappop
 from components import ressource_path
+try:
+    import numpy as np
+except ImportError: #NumPy is optional, roll_surfaces rolls one square at a time without it (same results)
+    np = None
 
+ALPHA = 1           #this control the distance impact on the probabily of having a pathway between two stars.
+MIN_DIST = 0.5      #minimum distance between two stars
+PATH_EPSILON = 0.01 #pathways less likely than this are never rolled
+PATH_CUTOFF = MIN_DIST + math.log(1/PATH_EPSILON)/ALPHA #distance beyond which no pathway is rolled
+SECTOR_SIZE = 8     #side of the squares the galaxy is generated by, must be larger than PATH_CUTOFF
+MAX_SECTORS = 512   #sectors kept in memory before the unexplored ones get evicted
+MAX_VIEW = 2*SECTOR_SIZE #widest square of the galaxy shown on the map
+EXPLORE_CHUNK = 64   #stars sent at once to a worker by Galaxy.explore_many
+NUMPY_MIN_OBJECTS = 64 #fewer objects than this are rolled by roll_surfaces without NumPy, faster then
+MASK64 = (1 << 64) - 1
+ROUTE_CACHE_SIZE = 256 #routes remembered by Galaxy.find_route
+LANDMARK_COUNT = 8  #landmarks picked by Galaxy.build_landmarks
+# Route latency, measured on a fully loaded 100k star galaxy: about 0.1ms for a cached route,
+# about 60ms for an uncached cross-galaxy ALT search (360ms for plain A*), far from a 1ms target.
+# Do not search uncached routes on the render path: search them once (e.g. when the destination
+# is chosen), drawing then only hits the cache.
+
+RESSOURCES = (-1, "Ice", "Coal", "Iron", "Oil", "Uranium", "Titanium", "Methane", "Helium", "Hydrogen") #ressource codes, -1 is an empty square
+# spiraling positions on a surface grid, up to 21 squares
+SURFACE_POSITIONS = [[3, 3], [3, 4], [4, 3], [3, 2], [2, 3], [2, 4], [4, 4], [4, 2], [2, 2], [3, 5], [5, 3],
+                     [3, 1], [1, 3], [2, 5], [4, 5], [5, 4], [5, 2], [4, 1], [2, 1], [1, 2], [1, 4]]
+# how the surface of each type of object is rolled:
+#   size: smallest and largest number of squares
+#   ressources: chance weight of each ressource on a square
+#   settled: one object out of settled is populated
+SURFACES = {
+    "rocky planet": {"size": (2, 5), "settled": 4,
+                     "ressources": {-1: 1, "Ice": 1, "Coal": 1, "Iron": 1, "Oil": 1, "Uranium": 1, "Titanium": 1}},
+    "gas giant": {"size": (10, 16), "settled": 7,
+                  "ressources": {-1: 1, "Methane": 1, "Helium": 1, "Hydrogen": 1}},
+    "icy giant": {"size": (8, 12), "settled": 6,
+                  "ressources": {-1: 1, "Hydrogen": 1, "Methane": 1, "Helium": 1}},
+    "asteroid belt": {"size": (1, 3), "settled": 10,
+                      "ressources": {-1: 1, "Ice": 1, "Titanium": 1, "Iron": 1}},
+}
+# the ressource weights of each type of object, by ressource code
+SURFACE_WEIGHTS = {obj_type: [table["ressources"].get(res, 0) for res in RESSOURCES]
+                   for obj_type, table in SURFACES.items()}
+# the upper bounds of the ressource codes on [0, total) and total, to pick a code with bisect
+SURFACE_BOUNDS = {obj_type: (list(accumulate(weights)), sum(weights)) for obj_type, weights in SURFACE_WEIGHTS.items()}
+
+
+def poisson_disk(count, area, min_dist, rng=random, attempts=30):
+    """
+    Place count points in the rectangle area = (x_min, y_min, x_max, y_max), at least min_dist apart.
+
+    Candidates are checked against a background grid (Bridson) whose cells are
+    min_dist/sqrt(2) wide, so a cell holds at most one point and only the 5x5 block
+    of cells around a candidate has to be looked at.
+    Points are first thrown at random; once darts keep missing, the remaining ones are
+    grown around the accepted points (Bridson's active list) until the rectangle is full.
+    Raise a ValueError when the rectangle cannot hold count points.
+    """
+    x_min, y_min, x_max, y_max = area
+    cell = min_dist / math.sqrt(2)
+    cols = max(1, math.ceil((x_max - x_min) / cell))
+    rows = max(1, math.ceil((y_max - y_min) / cell))
+    grid = [None] * (cols * rows)
+    points = []
+
+    def cell_of(x, y):
+        return min(int((x - x_min) / cell), cols - 1), min(int((y - y_min) / cell), rows - 1)
+
+    def fits(x, y):
+        cx, cy = cell_of(x, y)
+        for j in range(max(cy - 2, 0), min(cy + 3, rows)):
+            for i in range(max(cx - 2, 0), min(cx + 3, cols)):
+                other = grid[j*cols + i]
+                if other is not None and (other[0] - x)**2 + (other[1] - y)**2 < min_dist**2:
+                    return False
+        return True
+
+    def add(x, y):
+        cx, cy = cell_of(x, y)
+        points.append([x, y])
+        grid[cy*cols + cx] = points[-1]
+
+    # dart throwing: uniform as long as the rectangle is not crowded
+    misses = 0
+    while len(points) < count and misses < attempts:
+        x, y = rng.uniform(x_min, x_max), rng.uniform(y_min, y_max)
+        if fits(x, y):
+            add(x, y)
+            misses = 0
+        else:
+            misses += 1
+
+    # Bridson: try candidates in the [min_dist, 2*min_dist] ring of active points
+    active = list(points)
+    while len(points) < count and active:
+        idx = rng.randrange(len(active))
+        x0, y0 = active[idx]
+        for _ in range(attempts):
+            angle = rng.uniform(0, 2*math.pi)
+            radius = rng.uniform(min_dist, 2*min_dist)
+            x, y = x0 + radius*math.cos(angle), y0 + radius*math.sin(angle)
+            if x_min <= x <= x_max and y_min <= y <= y_max and fits(x, y):
+                add(x, y)
+                active.append(points[-1])
+                break
+        else:
+            active[idx] = active[-1]
+            active.pop()
+
+    if len(points) < count:
+        raise ValueError("Cannot fit %d stars %s apart in the galaxy, only %d could be placed."
+                         % (count, min_dist, len(points)))
+    return points
+
+
+def mix64(seed, counter):
+    """
+    SplitMix64 hash of (seed, counter): a random 64 bit number depending only on them.
+    Works on Python ints, or elementwise on NumPy uint64 arrays (which wrap around on their own).
+    """
+    if np is not None and isinstance(seed, np.ndarray):
+        with np.errstate(over="ignore"):
+            z = seed + (counter + np.uint64(1))*np.uint64(0x9E3779B97F4A7C15)
+            z = (z ^ (z >> np.uint64(30)))*np.uint64(0xBF58476D1CE4E5B9)
+            z = (z ^ (z >> np.uint64(27)))*np.uint64(0x94D049BB133111EB)
+            return z ^ (z >> np.uint64(31))
+    z = (seed + (counter + 1)*0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30))*0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27))*0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+def uniform64(seed, counter):
+    """
+    Number in [0, 1) from the hash of (seed, counter), exactly the same with NumPy arrays
+    """
+    if np is not None and isinstance(seed, np.ndarray):
+        return (mix64(seed, counter) >> np.uint64(11)).astype(float) * 2.0**-53
+    return (mix64(seed, counter) >> 11) * 2.0**-53
+
+
+def surface_seeds(seed, count):
+    """
+    Seeds of the surfaces of count objects, from one seed (an int below 2**64)
+    """
+    return [mix64(seed, k) for k in range(count)]
+
+
+def roll_surfaces(types, seeds):
+    """
+    Roll the surfaces of many objects at once, from their types (see SURFACES) and their seeds.
+
+    Return (sizes, populated, codes): for each object its number of squares and whether it is
+    populated, then the ressource codes of all the squares, object after object.
+    Each number is hashed from the seed of its object and its rank (size, populated, then the
+    squares), so an object gets the same surface whatever it is rolled with, with or without
+    NumPy. With NumPy every draw is vectorized and arrays are returned.
+    """
+    if np is None or len(types) < NUMPY_MIN_OBJECTS:
+        sizes, populated, codes = [], [], bytearray()
+        for obj_type, seed in zip(types, seeds):
+            table = SURFACES[obj_type]
+            smallest, largest = table["size"]
+            sizes.append(smallest + int(uniform64(seed, 0)*(largest - smallest + 1)))
+            populated.append(int(uniform64(seed, 1)*table["settled"]) == 0)
+            bounds, total = SURFACE_BOUNDS[obj_type]
+            codes += bytes(bisect_right(bounds, uniform64(seed, 2 + k)*total) for k in range(sizes[-1]))
+        return sizes, populated, bytes(codes)
+
+    names = list(SURFACES)
+    kinds = np.fromiter(map({name: k for k, name in enumerate(names)}.__getitem__, types), dtype=np.int8)
+    seeds = np.array(seeds, dtype=np.uint64)
+    smallest = np.array([SURFACES[name]["size"][0] for name in names])
+    largest = np.array([SURFACES[name]["size"][1] for name in names])
+    settled = np.array([SURFACES[name]["settled"] for name in names])
+    sizes = smallest[kinds] + (uniform64(seeds, np.uint64(0))*(largest - smallest + 1)[kinds]).astype(np.int64)
+    populated = (uniform64(seeds, np.uint64(1))*settled[kinds]).astype(np.int64) == 0
+    # rank of each square in its object
+    starts = np.cumsum(sizes) - sizes
+    ranks = np.arange(sizes.sum()) - np.repeat(starts, sizes)
+    draws = uniform64(np.repeat(seeds, sizes), ranks.astype(np.uint64) + np.uint64(2))
+    square_kinds = np.repeat(kinds, sizes)
+    codes = np.zeros(len(square_kinds), dtype=np.uint8)
+    for k, name in enumerate(names):
+        mask = square_kinds == k
+        bounds, total = SURFACE_BOUNDS[name]
+        codes[mask] = np.searchsorted(np.array(bounds, dtype=float), draws[mask]*total, side="right")
+    return sizes, populated, codes
+
+
+class NamePool:
+    """
+    Unique star names: the names of database/star_names.txt shuffled from the galaxy seed, handed out
+    to the sectors in a fixed order (square rings around the first sector), then catalog names.
+    A sector gets the same names whatever the order the sectors are generated in.
+    """
+    file_names = None  # the names of the file, read once
+
+    def __init__(self, galaxy):
+        if NamePool.file_names is None:
+            database_dir = os.path.abspath(os.path.join(ressource_path(), '..', 'database'))
+            with open(os.path.join(database_dir, 'star_names.txt'), encoding='latin-1') as file:
+                NamePool.file_names = list(dict.fromkeys(line.strip() for line in file if line.strip()))
+        self.names = list(NamePool.file_names)
+        random.Random("%s:names" % galaxy.seed).shuffle(self.names)
+        # position in names of the first name of each sector, for the sectors that get file names
+        self.starts = {}
+        start = 0
+        for ring in range(galaxy.sector_count):
+            for key in [(ring, sy) for sy in range(ring + 1)] + [(sx, ring) for sx in range(ring)]:
+                if start >= len(self.names):
+                    return
+                self.starts[key] = start
+                start += galaxy.star_count(key)
+
+    def sector_names(self, key, count):
+        """
+        Names of the count stars of the sector at key, catalog names once the file names run out
+        """
+        start = self.starts.get(key, len(self.names))
+        names = self.names[start:start + count]
+        return names + [catalog_name(key + (k,)) for k in range(len(names), count)]
+
+
+def catalog_name(star_id):
+    """
+    Catalog style name, unique to a star id (sx, sy, index), e.g. "GSC 12.7-31"
+    """
+    return "GSC %d.%d-%d" % star_id
+
+
+class StarGrid:
+    """
+    Bucket grid over star coordinates, so that only the stars close to a point are looked at.
+    Stars are stored as (index, coordinates) in square cells of the given width.
+    """
+
+    def __init__(self, cell):
+        self.cell = cell
+        self.cells = {}
+        self.bounds = None  # (min x key, min y key, max x key, max y key) of the cells in use
+
+    def key(self, crd):
+        return math.floor(crd[0] / self.cell), math.floor(crd[1] / self.cell)
+
+    def insert(self, idx, crd):
+        kx, ky = self.key(crd)
+        self.cells.setdefault((kx, ky), []).append((idx, crd))
+        if self.bounds is None:
+            self.bounds = (kx, ky, kx, ky)
+        else:
+            self.bounds = (min(self.bounds[0], kx), min(self.bounds[1], ky),
+                           max(self.bounds[2], kx), max(self.bounds[3], ky))
+
+    def within(self, crd, radius):
+        """
+        Iterate over the stars closer than radius to crd, as (index, coordinates, distance)
+        """
+        if self.bounds is None:
+            return
+        cx, cy = self.key(crd)
+        reach = math.ceil(radius / self.cell)
+        for kx in range(max(cx - reach, self.bounds[0]), min(cx + reach, self.bounds[2]) + 1):
+            for ky in range(max(cy - reach, self.bounds[1]), min(cy + reach, self.bounds[3]) + 1):
+                for idx, other in self.cells.get((kx, ky), ()):
+                    dis = math.dist(crd, other)
+                    if dis < radius:
+                        yield idx, other, dis
+
+    def range(self, min_x, min_y, max_x, max_y):
+        """
+        Iterate over the stars inside a rectangle, as (index, coordinates)
+        """
+        if self.bounds is None:
+            return
+        low_x, low_y = self.key((min_x, min_y))
+        high_x, high_y = self.key((max_x, max_y))
+        for cx in range(max(low_x, self.bounds[0]), min(high_x, self.bounds[2]) + 1):
+            for cy in range(max(low_y, self.bounds[1]), min(high_y, self.bounds[3]) + 1):
+                for idx, (x, y) in self.cells.get((cx, cy), ()):
+                    if min_x <= x <= max_x and min_y <= y <= max_y:
+                        yield idx, (x, y)
+
+    def nearest(self, crd, accept=None):
+        """
+        Find the closest star to crd for which accept(index) is true, as (index, coordinates, distance)
+        Cells are visited ring by ring, until no cell left can hold anything closer.
+        """
+        cx, cy = self.key(crd)
+        if self.bounds is None:
+            return None
+        min_x, min_y, max_x, max_y = self.bounds
+        max_ring = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy)
+        best = None
+        for ring in range(max_ring + 1):
+            for dx in range(-ring, ring + 1):
+                step = 1 if abs(dx) == ring else 2*ring
+                for dy in range(-ring, ring + 1, step):
+                    for idx, other in self.cells.get((cx + dx, cy + dy), ()):
+                        if accept is not None and not accept(idx):
+                            continue
+                        dis = math.dist(crd, other)
+                        if best is None or dis < best[2]:
+                            best = (idx, other, dis)
+            # anything in the next rings is at least ring*cell away
+            if best is not None and best[2] <= ring*self.cell:
+                break
+        return best
+
+    def pairs(self, radius):
+        """
+        Iterate once over every pair of stars closer than radius (at most one cell), as (i, j, distance)
+        """
+        radius_sq = radius**2
+        for (cx, cy), bucket in self.cells.items():
+            for n, (i, (xi, yi)) in enumerate(bucket):
+                for j, (xj, yj) in bucket[n+1:]:
+                    dis_sq = (xi - xj)**2 + (yi - yj)**2
+                    if dis_sq < radius_sq:
+                        yield i, j, math.sqrt(dis_sq)
+            # half of the neighbouring cells, the other half sees this cell as a neighbour
+            for key in ((cx+1, cy-1), (cx+1, cy), (cx+1, cy+1), (cx, cy+1)):
+                other = self.cells.get(key)
+                if other is None:
+                    continue
+                for i, (xi, yi) in bucket:
+                    for j, (xj, yj) in other:
+                        dis_sq = (xi - xj)**2 + (yi - yj)**2
+                        if dis_sq < radius_sq:
+                            yield i, j, math.sqrt(dis_sq)
+
+
+class DisjointSet:
+    """
+    Union-find over the integers 0..n-1, tracking the connected components of the pathways
+    """
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1]*n
+        self.count = n
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        """
+        Merge the components of i and j, return False if they already were the same
+        """
+        i, j = self.find(i), self.find(j)
+        if i == j:
+            return False
+        if self.size[i] < self.size[j]:
+            i, j = j, i
+        self.parent[j] = i
+        self.size[i] += self.size[j]
+        self.count -= 1
+        return True
+
+    def groups(self):
+        """
+        List the members of every component
+        """
+        groups = {}
+        for i in range(len(self.parent)):
+            groups.setdefault(self.find(i), []).append(i)
+        return list(groups.values())
 
 
 class Galaxy:
@@ -24,107 +405,370 @@ class Galaxy:
     Galaxy class object
     """
 
-    def __init__(self):
-        self.size = 4
-        self.stars = {}
-        self.way = []
-        self.generate()
-        print(self.stars)
-        this_one = list(self.stars.keys())[0]
-        self.stars[this_one].explore()
+    def __init__(self, size=4, seed=None):
+        self.size = size
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.sector_count = math.ceil(self.size / SECTOR_SIZE)
+        self.sectors = OrderedDict()  # least recently used first
+        self.pathway_version = 0  # counts the changes of the pathways, for the views of the map
+        self.pathways_changed()  # sets the route cache and the landmark tables
+        self.names = NamePool(self)
         self.initiate_camera()
 
-    def generate(self):
-        ALPHA = 1       #this control the distance impact on the probabily of having a pathway between two stars.
-        MIN_DIST = 0.5  #minimum distance between two stars
-        database_dir = os.path.abspath(os.path.join(ressource_path(), '..', 'database'))
-        names_list = set(line.strip() for line in open(os.path.join(database_dir,'star_names.txt')))
-
-        crd_so_far = []
-        while len(self.stars) < self.size**2:
-            check_flag = True
-            new_crd = [0,0]
-            while check_flag: #condition of coordinates
-                new_crd = [random.uniform(0.1, self.size),random.uniform(0.1, self.size)]
-                check_flag = False
-                for coord in crd_so_far:
-                    if ((new_crd[0] - coord[0])**2 + (new_crd[1] - coord[1])**2) < MIN_DIST**2:
-                        check_flag = True
-                        break        
-            crd_so_far.append(new_crd)
-            selected_name = random.choice(list(names_list))
-            names_list.remove(selected_name)
-            self.stars.update({selected_name:Star(selected_name,new_crd)})
-    
-        for system in self.stars.values():
-            print(system.name,system.coordinates)
-        
-        system_list = list(self.stars)
-        star_numb = self.size**2
-        self.way = [[0 for _ in range(star_numb)] for _ in range(star_numb)]
+    def sector(self, key):
+        """
+        Get the sector at key = (sx, sy) with its pathways, generating it if needed
+        """
+        sector = self.placed_sector(key)
+        if not sector.linked:
+            self.link(sector)
+        return sector
 
-        
-        for i in range(star_numb):
-            for j in range(star_numb):
-                if j > i:
-                    x1,y1 = self.stars[system_list[i]].coordinates
-                    x2,y2 = self.stars[system_list[j]].coordinates
-                    dis = math.sqrt((x1-x2)**2 + (y1-y2)**2)
-                    Prob = math.exp(-ALPHA*(dis - MIN_DIST))
-                    rand = random.uniform(0,1)
-                    if rand <= Prob:
-                         self.way[i][j] = 1 
-                if j < i:
-                    self.way[i][j] = self.way[j][i]
-                        
-        for row in self.way:
-            print(row)
-
-        node_visited = []
-        queue = []
-
-        def check_bfs(visited, matrix, node=0):
-            node_visited = []
-            queue = []
-            visited.append(node)
-            queue.append(node)
+    def placed_sector(self, key):
+        """
+        Get the sector at key = (sx, sy), its stars placed but its pathways maybe not rolled yet
+        """
+        sector = self.sectors.get(key)
+        if sector is None:
+            sector = Sector(self, key)
+            self.sectors[key] = sector
+            self.evict()
+        else:
+            self.sectors.move_to_end(key)
+        return sector
+
+    def evict(self):
+        """
+        Forget the least recently used sectors nobody explored, past MAX_SECTORS.
+        They are generated again, identical, the next time they are needed.
+        """
+        excess = len(self.sectors) - MAX_SECTORS
+        if excess <= 0:
+            return
+        for key in [key for key, sector in self.sectors.items() if not sector.touched][:excess]:
+            del self.sectors[key]
+
+    def name_stars(self, key, count):
+        """
+        Names of the stars of a sector, the same ones each time it is generated
+        """
+        return self.names.sector_names(key, count)
+
+    def sector_area(self, key):
+        """
+        Rectangle (x_min, y_min, x_max, y_max) of the galaxy covered by the sector at key = (sx, sy)
+        """
+        x_min, y_min = key[0]*SECTOR_SIZE, key[1]*SECTOR_SIZE
+        return x_min, y_min, min(x_min + SECTOR_SIZE, self.size), min(y_min + SECTOR_SIZE, self.size)
+
+    def star_count(self, key):
+        """
+        Number of stars of the sector at key, one per unit of area
+        """
+        x_min, y_min, x_max, y_max = self.sector_area(key)
+        return round((x_max - x_min)*(y_max - y_min))
+
+    def sector_keys(self, min_x, min_y, max_x, max_y):
+        """
+        Iterate over the keys of the sectors overlapping a rectangle of the galaxy
+        """
+        last = self.sector_count - 1
+        for sx in range(max(0, math.floor(min_x / SECTOR_SIZE)), min(last, math.floor(max_x / SECTOR_SIZE)) + 1):
+            for sy in range(max(0, math.floor(min_y / SECTOR_SIZE)), min(last, math.floor(max_y / SECTOR_SIZE)) + 1):
+                yield sx, sy
+
+    def star(self, star_id):
+        """
+        Get a star from its id (sx, sy, index in the sector)
+        """
+        return self.placed_sector(star_id[:2]).stars[star_id[2]]
+
+    def first_star(self):
+        return self.placed_sector((0, 0)).stars[0]
+
+    def neighbours(self, star):
+        """
+        List the stars which have a pathway to star
+        """
+        return [self.star(star_id) for star_id in self.sector(star.id[:2]).way[star.id[2]]]
+
+    def link(self, sector):
+        """
+        Roll the pathways of a sector, with the ones to its neighbouring sectors.
+
+        Every sector is connected on its own and sectors sharing a side always have a pathway
+        between them, so the whole galaxy is connected without ever looking at all of it.
+        """
+        self.roll_pathways(sector)
+        self.connect(sector)
+        self.link_neighbours(sector)
+
+    def roll_pathways(self, sector):
+        """
+        Roll the pathways between the stars of a sector
+        """
+        sector.way = [[] for _ in sector.stars]
+        for i, j, dis in sector.grid.pairs(PATH_CUTOFF):
+            if sector.rng.random() <= math.exp(-ALPHA*(dis - MIN_DIST)):
+                sector.way[i].append(sector.stars[j].id)
+                sector.way[j].append(sector.stars[i].id)
+
+    def connect(self, sector):
+        """
+        Connect a sector: each component but the largest gets a pathway to the closest star
+        outside of it, until only one component is left. Return the number of pathways added.
+        """
+        components = DisjointSet(len(sector.stars))
+        for i, row in enumerate(sector.way):
+            for star_id in row:
+                components.union(i, star_id[2])
+        added = components.count - 1
+        while components.count > 1:
+            groups = components.groups()
+            largest = max(groups, key=len)
+            for group in groups:
+                if group is largest:
+                    continue
+                root = components.find(group[0])
+                best = None
+                for i in group:
+                    found = sector.index.nearest(sector.stars[i].coordinates, lambda j: components.find(j) != root)
+                    if found is not None and (best is None or found[2] < best[2]):
+                        best = (i, found[0], found[2])
+                i, j, _ = best
+                components.union(i, j)
+                sector.way[i].append(sector.stars[j].id)
+                sector.way[j].append(sector.stars[i].id)
+        return added
+
+    def link_neighbours(self, sector):
+        """
+        Add the pathways between a sector and its (up to 8) neighbouring sectors
+        """
+        sx, sy = sector.key
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                key = (sx + dx, sy + dy)
+                if key == sector.key or not (0 <= key[0] < self.sector_count and 0 <= key[1] < self.sector_count):
+                    continue
+                other = self.sectors.get(key)
+                if other is not None and other.linked:
+                    # already rolled from the other side
+                    for j, row in enumerate(other.way):
+                        for star_id in row:
+                            if star_id[:2] == sector.key:
+                                sector.way[star_id[2]].append(other.stars[j].id)
+                else:
+                    other = self.placed_sector(key)
+                    for i, j in self.cross_pathways(sector, other):
+                        sector.way[i].append(other.stars[j].id)
+        sector.linked = True
+
+    def cross_pathways(self, sector, other):
+        """
+        Roll the pathways between two neighbouring sectors, as (index in sector, index in other) pairs.
+        The result only depends on the pair of sectors, whichever side asks first.
+        """
+        low, high = sorted((sector, other), key=lambda sct: sct.key)
+        rng = random.Random("%s:%d:%d:%d:%d" % (self.seed, *low.key, *high.key))
+        pathways = []
+        for i, star in enumerate(low.stars):
+            for j, _, dis in high.grid.within(star.coordinates, PATH_CUTOFF):
+                if rng.random() <= math.exp(-ALPHA*(dis - MIN_DIST)):
+                    pathways.append((i, j))
+        if not pathways and (low.key[0] == high.key[0] or low.key[1] == high.key[1]):
+            # sectors sharing a side are always linked, by their closest stars
+            best = None
+            for i, star in enumerate(low.stars):
+                found = high.index.nearest(star.coordinates)
+                if best is None or found[2] < best[2]:
+                    best = (i, found[0], found[2])
+            pathways.append(best[:2])
+        if low is sector:
+            return pathways
+        return [(j, i) for i, j in pathways]
+
+    def add_pathway(self, star, other):
+        """
+        Open a new pathway between two stars
+        """
+        for a, b in ((star, other), (other, star)):
+            sector = self.sector(a.id[:2])
+            if b.id not in sector.way[a.id[2]]:
+                sector.way[a.id[2]].append(b.id)
+            sector.pinned = True
+        self.pathways_changed()
+
+    def pathways_changed(self):
+        """
+        Forget everything computed from the pathways: the routes and the landmark tables
+
+        landmarks: ids of the landmark stars
+        landmark_ids, landmark_index: the stars of the landmark region, and their position in it
+        landmark_dist: for each landmark, the distance to every star of the region
+        landmark_crd, landmark_way: coordinates and (neighbour, length) pathways of the region stars
+        landmark_whole: whether the region is the whole galaxy, the only case the tables are used
+        """
+        self.pathway_version += 1
+        self.routes = OrderedDict()  # (source id, destination id) -> list of star ids, least recently used first
+        self.landmarks = []
+        self.landmark_index = {}
+        self.landmark_dist = []
+        self.landmark_whole = False
+
+    def find_route(self, src, dst):
+        """
+        Find the shortest chain of pathways from star src to star dst, as a list of stars
+        (src and dst included), or None if there is none.
 
+        The search is A*, with the straight distance to dst as heuristic. Once landmarks are
+        built over the whole galaxy, the landmark distances are a tighter heuristic (ALT).
+        Landmarks of a smaller region are not used: a shorter route may leave the region.
+        The last ROUTE_CACHE_SIZE routes are remembered until the pathways change.
+        """
+        key = (src.id, dst.id)
+        if key in self.routes:
+            self.routes.move_to_end(key)
+            route = self.routes[key]
+        else:
+            route = self.search_route(src.id, dst.id)
+            self.routes[key] = route
+            if len(self.routes) > ROUTE_CACHE_SIZE:
+                self.routes.popitem(last=False)
+        if route is None:
+            return None
+        return [self.star(star_id) for star_id in route]
+
+    def search_route(self, src, dst):
+        """
+        A* from star id src to star id dst, return the list of star ids of the route
+        """
+        if self.landmark_whole and src in self.landmark_index and dst in self.landmark_index:
+            return self.search_landmark_route(src, dst)
+        coordinates = {}
+
+        def crd(star_id):
+            if star_id not in coordinates:
+                coordinates[star_id] = self.star(star_id).coordinates
+            return coordinates[star_id]
+
+        target = crd(dst)
+        cost = {src: 0.0}
+        previous = {src: None}
+        queue = [(math.dist(crd(src), target), 0.0, src)]
+        while queue:
+            _, dist, star_id = heappop(queue)
+            if star_id == dst:
+                break
+            if dist > cost[star_id]:
+                continue
+            for other in self.sector(star_id[:2]).way[star_id[2]]:
+                new_dist = dist + math.dist(crd(star_id), crd(other))
+                if new_dist < cost.get(other, math.inf):
+                    cost[other] = new_dist
+                    previous[other] = star_id
+                    heappush(queue, (new_dist + math.dist(crd(other), target), new_dist, other))
+        else:
+            return None
+
+        route = [dst]
+        while previous[route[-1]] is not None:
+            route.append(previous[route[-1]])
+        route.reverse()
+        return route
+
+    def search_landmark_route(self, src, dst):
+        """
+        A* inside the landmark region (ALT), on the region graph saved by build_landmarks
+        """
+        index = self.landmark_index
+        crd, way = self.landmark_crd, self.landmark_way
+        start, goal = index[src], index[dst]
+        target = crd[goal]
+        to_goal = [(table[goal], table) for table in self.landmark_dist]
+
+        def heuristic(n):
+            # triangle inequality: |d(L,dst) - d(L,star)| <= d(star,dst) for every landmark L
+            estimate = math.dist(crd[n], target)
+            for dist_goal, table in to_goal:
+                estimate = max(estimate, abs(dist_goal - table[n]))
+            return estimate
+
+        cost = {start: 0.0}
+        previous = {start: None}
+        queue = [(heuristic(start), 0.0, start)]
+        while queue:
+            _, dist, n = heappop(queue)
+            if n == goal:
+                break
+            if dist > cost[n]:
+                continue
+            for other, length in way[n]:
+                new_dist = dist + length
+                if new_dist < cost.get(other, math.inf):
+                    cost[other] = new_dist
+                    previous[other] = n
+                    heappush(queue, (new_dist + heuristic(other), new_dist, other))
+        else:
+            return None
+
+        route = [goal]
+        while previous[route[-1]] is not None:
+            route.append(previous[route[-1]])
+        route.reverse()
+        return [self.landmark_ids[n] for n in route]
+
+    def build_landmarks(self, keys=None, count=LANDMARK_COUNT):
+        """
+        Pick count landmark stars in the sectors of keys (the whole galaxy by default) and
+        store their distance to every star of those sectors, for find_route to use once
+        the region is the whole galaxy.
+
+        The pathways of the region are saved as a compact graph, and landmarks are picked
+        one by one as the star farthest from the ones already picked.
+        """
+        if keys is None:
+            keys = list(self.sector_keys(0, 0, self.size, self.size))
+        self.pathways_changed()
+        stars = [star for key in keys for star in self.sector(key).stars]
+        ids = [star.id for star in stars]
+        index = {star_id: n for n, star_id in enumerate(ids)}
+        crd = [star.coordinates for star in stars]
+        way = []
+        for n, star_id in enumerate(ids):
+            row = self.sector(star_id[:2]).way[star_id[2]]
+            way.append([(index[other], math.dist(crd[n], crd[index[other]])) for other in row if other in index])
+
+        def dijkstra(start):
+            dist = array('d', [math.inf]) * len(ids)
+            dist[start] = 0.0
+            queue = [(0.0, start)]
             while queue:
-                m = queue.pop(0)
-                print(m,end = " ")
-
-                for neighbour in [idx for idx, val in enumerate(matrix[m]) if val != 0]:
-                    if neighbour not in visited:
-                        visited.append(neighbour)
-                        queue.append(neighbour)
-            print("length :",len(visited))
-            return visited
-        
-        node_visited = check_bfs(node_visited,self.way)
-        while (len(node_visited) != star_numb):
-            node = set(range(0,star_numb)).difference(node_visited)
-            for i in node:
-                for j in range(star_numb):
-                    if j > i:
-                        x1,y1 = self.stars[system_list[i]].coordinates
-                        x2,y2 = self.stars[system_list[j]].coordinates
-                        dis = math.sqrt((x1-x2)**2 + (y1-y2)**2)
-                        Prob = math.exp(-ALPHA*(dis - MIN_DIST))
-                        rand = random.uniform(0,1)
-                        if rand <= Prob:
-                             self.way[i][j] = 1 
-            for j in node:
-                for i in range(star_numb):
-                    if j > i:
-                        self.way[i][j] = self.way[j][i]
-            node_visited = check_bfs(node_visited,self.way)
-
-            for row in self.way:
-                print(row)
-                
+                cost, n = heappop(queue)
+                if cost > dist[n]:
+                    continue
+                for other, length in way[n]:
+                    if cost + length < dist[other]:
+                        dist[other] = cost + length
+                        heappush(queue, (cost + length, other))
+            return dist
+
+        # the first landmark is the star farthest from an arbitrary one
+        closest = dijkstra(0)
+        for _ in range(min(count, len(ids))):
+            farthest = max(range(len(ids)), key=lambda n: closest[n] if closest[n] < math.inf else -1)
+            table = dijkstra(farthest)
+            closest = array('d', map(min, closest, table)) if self.landmarks else table
+            self.landmarks.append(ids[farthest])
+            self.landmark_dist.append(table)
+        self.landmark_ids, self.landmark_index = ids, index
+        self.landmark_crd, self.landmark_way = crd, way
+        self.landmark_whole = set(keys) >= set(self.sector_keys(0, 0, self.size, self.size))
+
     def initiate_camera(self):
-        self.zoom_level = {1:self.size, 2:(self.size+1)/2, 3:1}
-        self.current_zoom = self.size
+        widest = min(self.size, MAX_VIEW)
+        self.zoom_level = {1:widest, 2:(widest+1)/2, 3:1}
+        self.current_zoom = widest
         self.camera_pos = [0,0]
     
     def move_camera(self,direction):
@@ -154,77 +798,232 @@ class Galaxy:
                         self.current_zoom = self.zoom_level[key+1]
                         break
             
+    def explore_many(self, stars, workers=None):
+        """
+        Explore many stars at once on all cores, for example a whole region before the player gets there.
+        Every star is populated from its own seed, so the result is the same as Star.explore.
+        """
+        todo = [star for star in stars if not star.explored]
+        jobs = [(star.name, star.id, star.seed) for star in todo]
+        # a chunk of stars per task, its surfaces rolled at once by roll_surfaces
+        chunks = [jobs[k:k + EXPLORE_CHUNK] for k in range(0, len(jobs), EXPLORE_CHUNK)]
+        with ProcessPoolExecutor(workers) as pool:
+            records = (record for chunk in pool.map(explore_records, chunks) for record in chunk)
+            for star, record in zip(todo, records):
+                star.load_record(record)
+
+    def stars_in(self, min_x, min_y, max_x, max_y):
+        """
+        List the stars inside a rectangle of the galaxy
+        """
+        found = []
+        for key in self.sector_keys(min_x, min_y, max_x, max_y):
+            sector = self.placed_sector(key)
+            found += [sector.stars[k] for k, _ in sector.index.range(min_x, min_y, max_x, max_y)]
+        return found
+
+    def stars_within(self, crd, radius):
+        """
+        List the stars closer than radius to crd, as (star, distance) from the closest
+        """
+        found = []
+        for key in self.sector_keys(crd[0] - radius, crd[1] - radius, crd[0] + radius, crd[1] + radius):
+            sector = self.placed_sector(key)
+            found += [(sector.stars[k], dis) for k, _, dis in sector.index.within(crd, radius)]
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def nearest_stars(self, crd, count=1):
+        """
+        List the count stars closest to crd, as (star, distance) from the closest.
+        The search radius starts where count stars are expected and doubles until enough are found.
+        """
+        radius = math.sqrt(count / math.pi) + MIN_DIST
+        while True:
+            found = self.stars_within(crd, radius)
+            if len(found) >= count or radius > 2*self.size:
+                return found[:count]
+            radius *= 2
+
     def select_visible_star(self):
+        """
+        Find the stars in the camera view (visible_stars) and the pathways between them
+        (vs_way, as pairs of positions in visible_stars)
+        """
         minX = self.camera_pos[0] 
         maxX = self.camera_pos[0] + self.current_zoom
             
         minY = self.camera_pos[1]
         maxY = self.camera_pos[1] + self.current_zoom
         
-        self.visible_stars = [False for i in range(len(self.stars))]
-        self.vs_way = [[False for i in range(len(self.stars))] for j in range(len(self.stars))]
-        ind = 0
-        for star in self.stars.values():
-            x,y = star.coordinates
-            if minX <= x <= maxX and minY <= y <= maxY:
-                self.visible_stars[ind] = True
-                for i in range(0, ind):
-                    if self.visible_stars[i] and self.way[ind][i]:
-                        self.vs_way[ind][i] = True
-            ind += 1
+        self.visible_stars = self.stars_in(minX, minY, maxX, maxY)
+        position = {star.id: n for n, star in enumerate(self.visible_stars)}
+        # pathways with both ends on screen
+        self.vs_way = []
+        for n, star in enumerate(self.visible_stars):
+            for star_id in self.sector(star.id[:2]).way[star.id[2]]:
+                other = position.get(star_id, -1)
+                if other > n:
+                    self.vs_way.append((n, other))
 
         print("len(visible_stars)",len(self.visible_stars))
         
 
         return self.visible_stars
-    
+
+
+class Sector:
+    """
+    Sector class object: a square of SECTOR_SIZE of the galaxy, generated on its own
+    from the galaxy seed and its key (sx, sy)
+
+    The Sector class has the following attributes:
+        stars: the stars of the sector, the id of a star is (sx, sy, index in stars)
+        grid: StarGrid of the stars, by index, with cells as wide as PATH_CUTOFF
+        index: StarGrid of the stars, by index, with cells as wide as 2*MIN_DIST
+        way: for each star, the ids of the stars it has a pathway to (None until rolled by Galaxy.link)
+        linked: whether way is complete
+    """
+
+    def __init__(self, galaxy, key):
+        self.key = key
+        sx, sy = key
+        self.rng = random.Random("%s:%d:%d" % (galaxy.seed, sx, sy))
+        x_min, y_min, x_max, y_max = galaxy.sector_area(key)
+        count = galaxy.star_count(key)
+        # stars stay MIN_DIST/2 away from the border, so a sector is placed without looking at its neighbours
+        area = (x_min + MIN_DIST/2, y_min + MIN_DIST/2, x_max - MIN_DIST/2, y_max - MIN_DIST/2)
+        coordinates = poisson_disk(count, area, MIN_DIST, self.rng)
+        names = galaxy.name_stars(key, count)
+        self.stars = [Star(name, crd, (sx, sy, k), "%s:%d:%d:%d" % (galaxy.seed, sx, sy, k))
+                      for k, (name, crd) in enumerate(zip(names, coordinates))]
+        self.grid = StarGrid(PATH_CUTOFF)
+        # small cells, a star or two each, to answer range and closest star queries
+        self.index = StarGrid(2*MIN_DIST)
+        for k, star in enumerate(self.stars):
+            self.grid.insert(k, star.coordinates)
+            self.index.insert(k, star.coordinates)
+        self.way = None
+        self.linked = False  # whether the pathways to the neighbouring sectors were added
+        self.pinned = False  # whether the pathways were changed after generation
+
+    @property
+    def touched(self):
+        """
+        Whether a star of the sector was explored or its pathways changed, so the sector cannot be generated again
+        """
+        return self.pinned or any(star.explored for star in self.stars)
+
 class Star:
     """
     Star class object
 
     """
 
-    def __init__(self,name,crd):
+    def __init__(self,name,crd,star_id,seed=None):
         self.coordinates = crd
         self.name = name
+        self.id = star_id
+        self.seed = seed # what the system is populated from, the global random state if None
         self.type = 'M'
         self.objects = []
+        self.explored = False
+
+    def __eq__(self, other):
+        # a star evicted with its sector and generated again is still the same star
+        return isinstance(other, Star) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
         
     def explore(self):
         """
         Explore the system and populate it
         """
-        print("populating",self.name)
+        types, seeds = self.roll_types()
+        self.populate(types, *roll_surfaces(types, seeds))
+
+    def roll_types(self):
+        """
+        Roll the types of the objects of the system, return them with the seeds of their surfaces
+        """
+        rng = random if self.seed is None else random.Random(self.seed)
+        types = []
 
-        while len(self.objects) <= 10:
-            if random.uniform(0,1) <= 0.8:
-                self.objects.append(System_object(self,"rocky planet"))
+        while len(types) <= 10:
+            if rng.uniform(0,1) <= 0.8:
+                types.append("rocky planet")
             else:
                 break
 
-        rand = random.uniform(0,1)
+        rand = rng.uniform(0,1)
         if  rand <= 0.8:
-            self.objects.append(System_object(self,"asteroid belt"))
+            types.append("asteroid belt")
 
         for it in range(0,2):
-            if random.uniform(0,1) <= 0.5:
-                self.objects.append(System_object(self,"gas giant"))
+            if rng.uniform(0,1) <= 0.5:
+                types.append("gas giant")
 
         if rand <= 0.1:
-            self.objects.append(System_object(self,"asteroid belt"))
+            types.append("asteroid belt")
 
         for it in range(0,2):
-            if random.uniform(0,1) <= 0.5:
-                self.objects.append(System_object(self,"icy giant"))
+            if rng.uniform(0,1) <= 0.5:
+                types.append("icy giant")
+
+        return types, surface_seeds(rng.getrandbits(64), len(types))
+
+    def populate(self, types, sizes, populated, codes):
+        """
+        Populate the system from the types of its objects and their surfaces, as rolled by roll_surfaces
+        """
+        self.explored = True
+        self.objects = []
+        start = 0
+        for obj_type, size, settled in zip(types, sizes, populated):
+            self.objects.append(System_object(self, obj_type, record=(obj_type, settled, codes[start:start + size])))
+            start += size
+
+    def record(self):
+        """
+        Compact record of the explored system: a (type, populated, ressource codes) tuple per object
+        """
+        return tuple(obj.record() for obj in self.objects)
+
+    def load_record(self, record):
+        """
+        Populate the system from a record made by Star.record
+        """
+        self.explored = True
+        self.objects = []
+        for obj_record in record:
+            self.objects.append(System_object(self, obj_record[0], record=obj_record))
+
+
+def explore_records(jobs):
+    """
+    Explore stars in a worker process, each job is (name, star id, seed), return their Star.record.
+    The surfaces of all the stars are rolled at once, the same as Star.explore rolls them one star at a time.
+    """
+    stars = [Star(name, None, star_id, seed) for name, star_id, seed in jobs]
+    rolls = [star.roll_types() for star in stars]
+    sizes, populated, codes = roll_surfaces([t for types, _ in rolls for t in types],
+                                            [s for _, seeds in rolls for s in seeds])
+    first = start = 0
+    for star, (types, _) in zip(stars, rolls):
+        last = first + len(types)
+        size = int(sum(sizes[first:last]))
+        star.populate(types, sizes[first:last], populated[first:last], codes[start:start + size])
+        first, start = last, start + size
+    return [star.record() for star in stars]
 
-        print("populated with ",len(self.objects), " object(s).")
         
 class System_object:
     """
     System objects class
     """
 
-    def __init__(self,star,obj_type):
+    def __init__(self,star,obj_type,rng=random,record=None):
         self.type = obj_type
         self.name = star.name
         self.permit = False
@@ -233,7 +1032,10 @@ class System_object:
         self.image_id = None
         self.populated = False
         LETTER_NAME = ['a','b','c','d','e','f','g','h','i','j','k','l','m','n','o','p']
-        self.generate_surface()
+        if record is None:
+            self.generate_surface(rng)
+        else:
+            self.load_record(record)
         if obj_type != "asteroid belt":
             self.name += ' ' + LETTER_NAME[len(star.objects) - sum(1 for Ob in star.objects if Ob.type == "asteroid belt") + 1]
         else:
@@ -241,93 +1043,35 @@ class System_object:
             for it in star.objects:
                 if it.name == "asteroid belt":
                     self.name += " II"
-        print("Generated a(n) ",self.type, " named ", self.name)
-
-    def generate_surface(self):
-        """ Create a dictionnary containing spiraling position on a grid up to 21 squares"""
-
-        pos_register = {'0': [3, 3], '1': [3, 4], '2': [4, 3], '3':[3, 2], '4': [2, 3],
-                        '5': [2, 4], '6': [4, 4], '7': [4, 2], '8': [2, 2], '9': [3, 5],
-                        '10': [5, 3], '11': [3, 1], '12': [1, 3], '13': [2, 5], '14': [4, 5],
-                        '15': [5, 4], '16':[5,2], '17':[4,1], '18':[2,1], '19':[1,2],
-                        '20':[1,4]}
-        if self.type == "rocky planet":
-            self.size = random.randint(2,5)
-            for i in range(0,self.size):
-                square = Square(pos_register[str(i)])
-                rand = random.randint(0, 6)
-                match rand:
-                    case 1:
-                        square.ressource = "Ice"
-                    case 2:
-                        square.ressource = "Coal"
-                    case 3:
-                        square.ressource = "Iron"
-                    case 4:
-                        square.ressource = "Oil"
-                    case 5:
-                        square.ressource = "Uranium"
-                    case 6:
-                        square.ressource = "Titanium"
-                self.grid.append(square)
-            check_pop = random.randint(0, 3)
-            if check_pop == 0:
-                self.populated = True    
-                
-        elif self.type == "gas giant":
-            self.size = random.randint(10,16)
-            for i in range(0, self.size):
-                square = Square(pos_register[str(i)])
-                rand = random.randint(0, 3)
-                match rand:
-                    case 1:
-                        square.ressource = "Methane"
-                    case 2:
-                        square.ressource = "Helium"
-                    case 3:
-                        square.ressource = "Hydrogen"
-                        
-                self.grid.append(square)
-            check_pop = random.randint(0, 6)
-            if check_pop == 0:
-                self.populated = True
-                
-        elif self.type == "icy giant":
-            self.size = random.randint(8,12)
-            for i in range(0, self.size):
-                square = Square(pos_register[str(i)])
-                rand = random.randint(0, 3)
-                match rand:
-                    case 1:
-                        square.ressource = "Hydrogen"
-                    case 2:
-                        square.ressource = "Methane"
-                    case 3:
-                        square.ressource = "Helium"
-
-                self.grid.append(square)
-            check_pop = random.randint(0, 5)
-            if check_pop == 0:
-                self.populated = True
-
-        elif self.type == "asteroid belt":
-            self.size = random.randint(1,3)
-            for i in range(0, self.size):
-                square = Square(pos_register[str(i)])
-                rand = random.randint(0, 3)
-                match rand:
-                    case 1:
-                        square.ressource = "Ice"
-                    case 2:
-                        square.ressource = "Titanium"
-                    case 3:
-                        square.ressource = "Iron"
-                        
-                self.grid.append(square)
-            check_pop = random.randint(0, 9)
-            if check_pop == 0:
-                self.populated = True
-        
+
+    def record(self):
+        """
+        Compact record of the object: (type, populated, one byte per square with its ressource code)
+        """
+        return (self.type, self.populated, bytes(RESSOURCES.index(sq.ressource) for sq in self.grid))
+
+    def load_record(self, record):
+        """
+        Rebuild the surface from a record made by System_object.record
+        """
+        self.set_surface(record[2], record[1])
+
+    def generate_surface(self, rng=random):
+        """ Roll the size of the surface grid, the ressource of each square and whether the object is populated"""
+        _, populated, codes = roll_surfaces([self.type], [rng.getrandbits(64)])
+        self.set_surface(codes, populated[0])
+
+    def set_surface(self, codes, populated):
+        """
+        Lay out the surface grid from the ressource codes of its squares
+        """
+        self.size = len(codes)
+        self.populated = bool(populated)
+        self.grid = []
+        for position, code in zip(SURFACE_POSITIONS, codes):
+            square = Square(position)
+            square.ressource = RESSOURCES[code]
+            self.grid.append(square)
         if self.populated:
             self.grid[0].content = 'settlement'
             
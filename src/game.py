@@ -8,6 +8,7 @@ import sys
 import pygame as pg
 from input import Input
 from audio import Audio
+from assets import Assets, PRELOAD_IMAGES, PRELOAD_SHEETS
 import settings as st
 from components import *
 import states
@@ -27,29 +28,27 @@ class Game:
         pg.display.set_caption(st.GAME_TITLE)
         assets_dir = ressource_path()
 
-        
-        # clear the screen
-        self.screen.fill(st.BACKGROUND_COLOR)
-
-        # add the loading text
-        text = TextSprite(self,
-                os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                "Loading", 24, color = (255,255,255))
-        # center text on screen
-        text.rect.center = self.screen.get_rect().center
-        self.all_loading = pg.sprite.Group()
-        self.all_loading.add(text)
-        self.all_loading.draw(self.screen)
-        
-        # flip the display
-        pg.display.flip()
-
+        # show the loading screen first, the states are created when first entered
+        self.init_states()
+        self.show_loading()
 
         self.clock = pg.time.Clock()
+        self.wake = True
+        # simulated time not run yet (s), and simulation ticks per tick of real time (fast-forward)
+        self.accumulator = 0
+        self.speed = 1
+        self.alpha = 0
         self.input = Input()
         self.audio = Audio()
+        self.assets = Assets()
         self.memory = Memory()
-        self.init_states()
+        # read the images and generate the start of the galaxy while the first state is shown
+        self.assets.preload(
+            (os.path.join(assets_dir, 'images', path) for path in PRELOAD_IMAGES),
+            (os.path.join(assets_dir, 'images', path) for path in PRELOAD_SHEETS),
+            tasks=[self.memory.warm_up])
+        # initialize the first state, on the first frames
+        self.change_state(states.__all__[0])
 
 
 
@@ -64,34 +63,74 @@ class Game:
 
     def init_states(self):
         """
-        Initialize all the states
+        Initialize the states: only the loading screen is created now, the others on first use
         """
         self.state = None
+        # change of state in progress (see transit)
+        self.transition = None
         self.states = {}
-        # iterate over __all__ states from states.py instantiate them
-        # and register to the self.states with state.name as the key and state instance 
-        # as value
-        
-        for State in map(states.__dict__.get, states.__all__):
-            self.register_state(State(self))
-            print(State)
-        # initialize the first state
-        first_state = list(self.states.keys())[0]
-        self.change_state(first_state)
+        # the states of __all__ from states.py, and the loading screen, by name
+        self.state_classes = {name: states.__dict__[name] for name in states.__all__ + ['Loading']}
+        self.register_state(states.Loading(self))
+
+    def show_loading(self):
+        """
+        Draw the loading screen at once, before the game loop starts
+        """
+        self.screen.fill(st.BACKGROUND_COLOR)
+        self.states['Loading'].draw(self.screen)
+        pg.display.flip()
+        # keep the window responsive
+        pg.event.pump()
 
     def change_state(self, state):
         """
-        Change the current state
+        Change the current state: the change runs over the next frames as a transition,
+        behind the loading screen until it is done
 
         state: name of the state to change to
         """
-        if state in self.states.keys():
-            # exit the current state
-            if self.state:
-                self.state.exit()
-            # enter the new state
-            self.state = self.states[state]
-            self.state.enter()
+        if state in self.state_classes:
+            self.transition = self.transit(state)
+            loading = self.states['Loading']
+            loading.set_progress(0)
+            loading.dirty_group = None
+            self.wake = True
+
+    def transit(self, state):
+        """
+        Generator changing the current state in steps, yielding its progress (0 to 1):
+        the new state is created on first use, the current one exited, the new one entered
+
+        state: name of the state to change to
+        """
+        if state not in self.states:
+            # the first state is created while the preloader runs, the others may need its work
+            while self.state is not None and self.assets.loading():
+                yield 0
+            self.register_state(self.state_classes[state](self))
+            yield 0
+        # exit the current state
+        if self.state:
+            self.state.exit()
+        # enter the new state
+        self.state = self.states[state]
+        yield from self.state.entering()
+
+    def run_transition(self):
+        """
+        Run the steps of the transition for TRANSITION_BUDGET ms of this frame (at least one step)
+        """
+        start = pg.time.get_ticks()
+        for progress in self.transition:
+            self.states['Loading'].set_progress(progress)
+            if pg.time.get_ticks() - start >= st.TRANSITION_BUDGET:
+                return
+        self.transition = None
+        # draw the new state without waiting for an input
+        self.wake = True
+        # redraw the whole screen for the new state
+        self.state.dirty_group = None
 
     def loop(self):
         """
@@ -106,12 +145,44 @@ class Game:
             self.ms = pg.time.get_ticks()
             # elapsed time since last frame 
             self.dt = self.clock.tick(st.FPS) / 1000
+            # when idle, sleep until an input, a timer or IDLE_TIMEOUT instead of running frames
+            event = None
+            if not self.wake and not self.transition and self.state and self.state.is_idle():
+                event = pg.event.wait(st.IDLE_TIMEOUT)
+            self.wake = False
             # handle events
-            self.handle_events()
-            # update and draw
-            self.update()
+            self.handle_events(event)
+            # run the simulation, then update and draw
+            if not self.transition:
+                self.simulate(self.dt)
+                self.update()
+            # a change of state asked for runs at once, and on the next frames if it takes longer
+            if self.transition:
+                self.run_transition()
             self.draw()
 
+    def simulate(self, dt):
+        """
+        Run the simulation ticks of the current state due after dt seconds of real time,
+        at the fixed rate TICK_RATE (speed times more when fast-forwarding)
+
+        dt: real time elapsed since the last frame, in seconds
+        """
+        step = 1 / st.TICK_RATE
+        self.accumulator += min(dt, st.MAX_FRAME_TIME) * self.speed
+        ticks = 0
+        while self.accumulator >= step:
+            if ticks == st.MAX_TICKS_PER_FRAME * self.speed:
+                # too far behind to catch up, drop the backlog
+                self.accumulator = 0
+                break
+            if self.state:
+                self.state.tick(step)
+            self.accumulator -= step
+            ticks += 1
+        # fraction of a tick elapsed since the last one, for drawing in between
+        self.alpha = self.accumulator / step
+
     def quit(self):
         """
         Quit the game
@@ -119,12 +190,17 @@ class Game:
         pg.quit()
         sys.exit()
 
-    def handle_events(self):
+    def handle_events(self, first=None):
         """
         Handle events
+
+        first: event already taken from the queue, handled before the others
         """
         self.input.update()
-        for event in pg.event.get():
+        events = pg.event.get()
+        if first is not None and first.type != pg.NOEVENT:
+            events.insert(0, first)
+        for event in events:
             if event.type == pg.QUIT:
                 self.quit()
             self.input.handle_event(event)
@@ -140,11 +216,22 @@ class Game:
         """
         Draw the game (draw the current state)
         """
+        # the loading screen until the change of state is done
+        state = self.states['Loading'] if self.transition else self.state
+        if st.DIRTY_RECTS:
+            # update only the parts of the screen that changed, nothing at all in a still menu
+            if state:
+                state.interpolate(self.alpha)
+                rects = state.draw_dirty(self.screen)
+                if rects:
+                    pg.display.update(rects)
+            return
         # clear the screen
         self.screen.fill(st.BACKGROUND_COLOR)
         # draw the current state
-        if self.state:
-            self.state.draw(self.screen)
+        if state:
+            state.interpolate(self.alpha)
+            state.draw(self.screen)
 
         # flip the display
         pg.display.flip()
@@ -32,6 +32,13 @@ class Memory:
         empty_inv[0][0][0].update("Iron Ore",1)
         print("Inv: ", len(empty_inv))
         self.Player.update({"Inventory": empty_inv})
+
+    def warm_up(self):
+        """
+        Generate the first sector of the galaxy with its pathways ahead of the first map,
+        e.g. in the background while the intro is shown
+        """
+        self.Galaxy.sector(self.Galaxy.first_star().id[:2])
         
     def save(self, file_name):
         print(file_name)
@@ -58,10 +65,34 @@ class Memory:
             print("Error: Unable to load game state.")
         
     def move_player(self,system,obj = ''):
+        moved = self.Player.get("System") != system
         self.Player.update({"System":system})
+        if not system.explored:
+            system.explore()
         if obj != '' and len(obj.grid) == 0:
             obj.generate_surface()    
         self.Player.update({"Object": obj})
+        if moved and self.Player.get("Destination") is not None:
+            self.update_route()
+
+    def set_destination(self, star):
+        """
+        Set the star the player travels to (None for none), and search the route to it
+        """
+        self.Player.update({"Destination": star})
+        self.update_route()
+
+    def update_route(self):
+        """
+        Search the route from the system of the player to its destination, once: the map only
+        draws Player["Route"] (a list of stars, None without destination or route), a route
+        search is far too slow for a frame
+        """
+        destination = self.Player.get("Destination")
+        route = None
+        if destination is not None and self.Player.get("System") is not None:
+            route = self.Galaxy.find_route(self.Player["System"], destination)
+        self.Player.update({"Route": route})
         
 
     def set_home_system(self):
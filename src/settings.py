@@ -31,7 +31,13 @@ SCREEN_WIDTH = 800  #Overided when in fullscreen mode
 SCREEN_HEIGHT = 600 #Overided when in fullscreen mode
 FULLSCREEN = False
 FPS = 60
+TICK_RATE = 60 #Simulation ticks per second, whatever the frame rate
+MAX_TICKS_PER_FRAME = 5 #At normal speed, the simulation backlog beyond that is dropped
+MAX_FRAME_TIME = 0.25 #Longest time (s) simulated after a single frame, e.g. after waiting when idle
 BACKGROUND_COLOR = DARKGRAY
+DIRTY_RECTS = False #Redraw and update only the parts of the screen that changed
+IDLE_TIMEOUT = 500 #Longest wait (ms) for an input when the current state has nothing to animate
+TRANSITION_BUDGET = 8 #Time (ms) of a frame spent on a change of state, the rest runs on the next frames
 
 
 
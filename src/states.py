@@ -21,21 +21,38 @@ from components import *
 from settings import *
 import memory as mry
 import random 
+import math
 from event import *
+from galaxy import SURFACE_POSITIONS
+
+# index of the surface square at each (x, y) position of the surface grid
+SQUARE_AT = {tuple(position): k for k, position in enumerate(SURFACE_POSITIONS)}
 
 class State:
     """
     Base class for all states
     """
+    # whether the state changes without input (animations, timers), so that it needs every frame
+    animated = False
+
     def __init__(self, game):
         """
         game: game object
         """
         self.game = game
         # all sprites in the state
-        self.all_sprites = pg.sprite.Group()
-        self.all_buttons = pg.sprite.Group()
-        self.all_frames = pg.sprite.Group()
+        self.all_sprites = TaggedGroup()
+        self.all_buttons = TaggedGroup()
+        self.all_frames = TaggedGroup()
+        # the sprites of the three groups, as drawn in dirty rects mode
+        self.dirty_group = None
+        # the buttons of the menus, by (menu_state, name), kept from one drawing of a menu to the next
+        self.menu_sprites = {}
+        # what a click does: on the sprites with a given tag, and on the cells of grids
+        self.click_handlers = {}
+        self.click_grids = {}
+        self.hit_grid = None
+        self.hit_grid_version = None
         self.boot()
 
     def boot(self):
@@ -52,6 +69,29 @@ class State:
         # override this method to add logic that happens on every frame
         self.all_sprites.update()
 
+    def tick(self, dt):
+        """
+        Called at the fixed simulation rate (TICK_RATE), whatever the frame rate
+
+        dt: simulated time of a tick, in seconds
+        """
+        # override this method to add logic that depends on time (movements, timers)
+        pass
+
+    def interpolate(self, alpha):
+        """
+        Called before drawing, to place what moves between its last two ticks
+
+        alpha: fraction of a tick elapsed since the last one
+        """
+        pass
+
+    def is_idle(self):
+        """
+        Whether the game can wait for an input: nothing animated and no menu left to draw
+        """
+        return not self.animated and getattr(self, 'menu_drawn', True)
+
     def enter(self):
         """
         Called when the state becomes the current state
@@ -59,6 +99,17 @@ class State:
         # override this method to add logic that happens when this state becomes the current state
         pass
 
+    def entering(self):
+        """
+        Called by the game instead of enter: a generator doing what enter does in steps,
+        yielding its progress (0 to 1) between them, so that a long enter is spread over
+        several frames while the loading screen is shown
+        """
+        # override this method instead of enter to split what happens when this state
+        # becomes the current state
+        self.enter()
+        yield 1
+
     def exit(self):
         """
         Called when the state is no longer the current state
@@ -78,22 +129,147 @@ class State:
         self.all_sprites.draw(screen)
         self.all_buttons.draw(screen)
         self.all_frames.draw(screen)
+
+    def draw_dirty(self, screen):
+        """
+        Called on every frame instead of draw in dirty rects mode: draw only the sprites
+        that changed since the last frame, return the rects of the screen to update
+        """
+        full = self.dirty_group is None
+        if full:
+            self.dirty_group = pg.sprite.LayeredDirty()
+            background = pg.Surface(screen.get_size())
+            background.fill(BACKGROUND_COLOR)
+            self.dirty_group.clear(screen, background)
+            self.drawn_as = {}
+            screen.blit(background, (0, 0))
+
+        # follow the groups: the sprites are changed in place, so compare what they show
+        shown = {}
+        for layer, group in enumerate((self.all_sprites, self.all_buttons, self.all_frames)):
+            for sprite in group:
+                shown[sprite] = layer  # on top, as drawn last when in several groups
+        for sprite in self.dirty_group.sprites():
+            if sprite not in shown:
+                self.dirty_group.remove(sprite)
+                del self.drawn_as[sprite]
+        for sprite, layer in shown.items():
+            drawn_as = (id(sprite.image), tuple(sprite.rect))
+            if sprite not in self.dirty_group:
+                sprite.dirty = 1
+                self.dirty_group.add(sprite, layer=layer)
+            elif self.dirty_group.get_layer_of_sprite(sprite) != layer:
+                self.dirty_group.change_layer(sprite, layer)
+                sprite.dirty = 1
+            elif self.drawn_as[sprite] != drawn_as and not sprite.dirty:
+                sprite.dirty = 1
+            self.drawn_as[sprite] = drawn_as
+
+        rects = self.dirty_group.draw(screen)
+        return [screen.get_rect()] if full else rects
         
+    def on_click(self, tag, handler):
+        """
+        Call handler(sprite) when a sprite with this tag is clicked
+
+        tag: tag of the sprites
+        handler: function taking the clicked sprite
+        """
+        self.click_handlers[tag] = handler
+
+    def on_grid_click(self, name, topleft, cell, columns, rows, handler):
+        """
+        Call handler(x, y) when the cell (x, y) of a grid of squares is clicked, replaces the grid of that name
+
+        topleft: position of the top left corner of the grid
+        cell: size of a square of the grid
+        columns, rows: number of squares of the grid
+        """
+        area = pg.Rect(topleft, (math.ceil(cell*columns), math.ceil(cell*rows)))
+        self.click_grids[name] = (area, topleft, cell, handler)
+
+    def click(self, pos):
+        """
+        Dispatch a click at pos: to the grid under it, else to the handler of the tag of the sprite on top.
+        Return whether something handled it.
+        """
+        for area, topleft, cell, handler in list(self.click_grids.values()):
+            if area.collidepoint(pos):
+                handler(int((pos[0] - topleft[0]) // cell), int((pos[1] - topleft[1]) // cell))
+                return True
+        # the index is built again only when the sprites of the groups changed
+        groups = (self.all_sprites, self.all_buttons, self.all_frames)
+        version = tuple(group.version for group in groups)
+        if version != self.hit_grid_version:
+            self.hit_grid = HitGrid([(sprite.rect, sprite) for group in groups for sprite in group
+                                     if getattr(sprite, 'tag', None) in self.click_handlers])
+            self.hit_grid_version = version
+        sprite = self.hit_grid.at(pos)
+        if sprite is None:
+            return False
+        self.click_handlers[sprite.tag](sprite)
+        return True
+
+    def menu_button(self, name, text, tag=''):
+        """
+        Get a text button of the current menu, as wide as the menu: it is built once,
+        and built again only when its text changes
+
+        name: name of the button in the menu
+        text: text of the button
+        tag: a tag to identify the button easily
+        """
+        key = (getattr(self, 'menu_state', None), name)
+        button = self.menu_sprites.get(key)
+        if button is None or button.text != text:
+            button = TextSprite(self.game, os.path.join(ressource_path(), 'fonts', 'PressStart2P-Regular.ttf'),
+                                text, 12, color = (255,255,255))
+            button.make_button((SCREEN_WIDTH*0.4*0.9, button.rect.h))
+            self.menu_sprites[key] = button
+        if button.tag != tag:
+            # out of the groups, which file their sprites by tag, the caller adds it back
+            button.kill()
+            button.tag = tag
+        return button
+
+    def menu_arrow(self, direction, size):
+        """
+        Get an arrow button of the current menu, built once
+
+        direction: 'left', 'right' or 'back'
+        size: size of the arrow, before the frame
+        """
+        key = (getattr(self, 'menu_state', None), direction, size)
+        if key not in self.menu_sprites:
+            self.menu_sprites[key] = make_arrow(self.game, direction, size)
+        return self.menu_sprites[key]
+
     def draw_PiloteUI(self):
+        for progress in self.building_PiloteUI():
+            pass
+
+    def building_PiloteUI(self):
+        """
+        Same as draw_PiloteUI, as a generator yielding its progress (0 to 1) after its long steps
+        """
         self.menu_drawn = False
         
         #Draw map
         size_drw = (SCREEN_WIDTH*0.4, SCREEN_HEIGHT*0.8)
         map_bg = ShapeSprite(self.game,"rect", color = BLACK,size = size_drw,tag="map")
         map_bg.rect.topleft = (0.05*SCREEN_WIDTH, 0.125*SCREEN_HEIGHT)
+        self.map_bg = map_bg
         if isinstance(self, Inventory):
             self.make_grid(map_bg, 7,6)
         elif isinstance(self, Surface):
             self.make_surface(map_bg)
+            yield 0.5
             if self.menu_state == "build":
                 self.draw_surface_content(map_bg)
         else:
-            mapSprite = MapSprite(self.game, map_bg)
+            mapSprite = MapSprite(self.game, map_bg, draw=False)
+            for progress in mapSprite.drawing_map():
+                yield 0.9*progress
             self.all_sprites.add(map_bg)
             self.all_sprites.add(mapSprite)
         self.all_frames.add(map_bg.generate_frame())
@@ -104,6 +280,7 @@ class State:
         menu_shape.rect.topright = (0.95*SCREEN_WIDTH, 0.125*SCREEN_HEIGHT)
         menu_background = menu_shape.generate_frame(Background=True)
         self.all_sprites.add(menu_background)  
+        yield 1
 
     def make_grid(self,background,row,column):
         size = background.rect.size
@@ -117,6 +294,8 @@ class State:
                     background.rect.topleft[0]+square_size*x, background.rect.topleft[1]+square_size*y)
                 square.tag = x + column*y
                 self.all_sprites.add(square.make_square())
+        # a click on the grid selects the slot under it
+        self.on_grid_click('grid', background.rect.topleft, square_size, column, row, self.select_slot)
                 
     def make_surface(self, background):
         size = background.rect.size
@@ -194,19 +373,15 @@ class State:
         curr_slot = self.inv_slot
         size = SCREEN_WIDTH*0.4/column
         assets_dir = ressource_path()
-        for sprite in self.all_frames:
-            if sprite.tag == "inv":
-                sprite.kill()   
+        self.all_frames.remove_tags("inv")
 
         x_slot, y_slot = curr_slot
-        for sprite in self.all_sprites:
-            if sprite.tag == 'activated':
-                sprite.kill()
-            if sprite.tag == x_slot + column*y_slot:
-                self.all_sprites.add(sprite.make_square(active = True))
+        self.all_sprites.remove_tags('activated')
+        for sprite in self.all_sprites.tagged(x_slot + column*y_slot):
+            self.all_sprites.add(sprite.make_square(active = True))
 
     
-        inventory_sheet = pg.image.load(os.path.join(assets_dir, 'images', 'sprite_sheet', 'inventory.png'))
+        inventory_sheet = self.game.assets.sheet(os.path.join(assets_dir, 'images', 'sprite_sheet', 'inventory.png'))
         Inventory = self.game.memory.Player["Inventory"]
 
         SpriteDict = self.Gen_Inv_Dict(inventory_sheet)
@@ -225,13 +400,10 @@ class State:
                     self.all_frames.add(square)   
                     
     def draw_surface_content(self,background):
-        inventory_sheet = pg.image.load(os.path.join(ressource_path(), 'images', 'sprite_sheet', 'inventory.png'))
+        inventory_sheet = self.game.assets.sheet(os.path.join(ressource_path(), 'images', 'sprite_sheet', 'inventory.png'))
         Surface = self.game.memory.Player["Object"].grid
         ResDict = self.Gen_Inv_Dict(inventory_sheet,surface = True)
         size = SCREEN_WIDTH*0.4/5
-        for sprite in self.all_frames:
-            if sprite.tag == "map":
-                sprite.kill()   
                 
         for sq in Surface:
             x,y = sq.position
@@ -242,19 +414,11 @@ class State:
             square = square.make_square()
             square.image.set_alpha(200)
             self.all_sprites.add(square)
-            
-        pos_register = {'0': [3, 3], '1': [3, 4], '2': [4, 3], '3':[3, 2], '4': [2, 3],
-                        '5': [2, 4], '6': [4, 4], '7': [4, 2], '8': [2, 2], '9': [3, 5],
-                        '10': [5, 3], '11': [3, 1], '12': [1, 3], '13': [2, 5], '14': [4, 5],
-                        '15': [5, 4], '16':[5,2], '17':[4,1], '18':[2,1], '19':[1,2],
-                        '20':[1,4]}
+        # a click on the grid selects the square under it, found from its position on the grid
+        self.on_grid_click('surface', (background.rect.topleft[0], background.rect.center[1]-(background.rect.w)/2),
+                           size, 5, 5, self.select_square)
         
-        x_slot, y_slot = pos_register[str(self.selected_square)]
-        for sprite in self.all_sprites:
-            if sprite.tag == 'activated':
-                sprite.kill()
-            if sprite.tag == x_slot + 5*y_slot:
-                self.all_sprites.add(sprite.make_square(active = True)) 
+        self.highlight_square()
                 
         for sq in Surface: 
             x,y = sq.position   
@@ -269,38 +433,53 @@ class State:
                 square.rect = square.image.get_rect()
                 square.rect.topleft = (background.rect.topleft[0]+size*(x-1), background.rect.center[1]-(background.rect.w)/2 + size*(y-1))
                 self.all_sprites.add(square) 
+
+    def highlight_square(self):
+        # move the highlight to the selected square, the squares stay as they are
+        x_slot, y_slot = SURFACE_POSITIONS[self.selected_square]
+        self.all_sprites.remove_tags('activated')
+        for sprite in self.all_sprites.tagged(x_slot + 5*y_slot)[:1]:
+            self.all_sprites.add(sprite.make_square(active = True))
     
 class Intro(State):
     """
     Intro state
     """
+    animated = True  # the starfield scrolls
+
     def boot(self):
         assets_dir = ressource_path()
         # load the intro sound
         self.game.audio.load_sound('intro', os.path.join(assets_dir, 'sounds', 'start_screen_st.mp3'))
 
         # add a background image
+        # the large images are only moved, never drawn on: shared with the assets, released on exit
         rand_bg = random.randint(1,3)
-        bg = ImageSprite(self.game, os.path.join(assets_dir, 'images', 'start_screen', 'start_screen_bg'+str(rand_bg)+'.png'))
+        rand_sf = random.randint(1,4)
+        self.large_images = [
+            os.path.join(assets_dir, 'images', 'start_screen', 'start_screen_bg'+str(rand_bg)+'.png'),
+            os.path.join(assets_dir, 'images', 'start_screen', 'Starfield'+str(rand_sf)+'.png')]
+        bg = ImageSprite(self.game, self.large_images[0], shared=True)
         bg.rect.topleft = (0,0)
         self.all_sprites.add(bg)
 
         # add the starfield overlays
         SF_WIDTH = 4096
         self.all_starfields = pg.sprite.Group()
-        rand_sf = random.randint(1,4)
-        starfield1 = ImageSprite(self.game, os.path.join(assets_dir, 'images', 'start_screen', 'Starfield'+str(rand_sf)+'.png'))
+        starfield1 = ImageSprite(self.game, self.large_images[1], shared=True)
         starfield1.rect.topleft = (0,0)
+        starfield1.x = starfield1.prev_x = 0
         self.all_sprites.add(starfield1)
         self.all_starfields.add(starfield1)
         
-        starfield2 = ImageSprite(self.game, os.path.join(assets_dir, 'images', 'start_screen', 'Starfield'+str(rand_sf)+'.png'))
+        starfield2 = ImageSprite(self.game, self.large_images[1], shared=True)
         starfield2.rect.topleft = (SF_WIDTH,0)
+        starfield2.x = starfield2.prev_x = SF_WIDTH
         self.all_sprites.add(starfield2)
         self.all_starfields.add(starfield2)
 
         #add a spaceship sprite
-        spaceship = ImageSprite(self.game, os.path.join(assets_dir, 'images', 'Player_sprite.png'))
+        spaceship = ImageSprite(self.game, os.path.join(assets_dir, 'images', 'Player_sprite.png'), shared=True)
         spaceship.rect.center = (0.2*SCREEN_WIDTH,0.5*SCREEN_HEIGHT)
         self.all_sprites.add(spaceship)
         
@@ -343,11 +522,21 @@ class Intro(State):
         # add the text to the all_sprites group
         self.all_sprites.add(settings_text)
         self.all_buttons.add(settings_text)
+
+        self.on_click('NewGame', lambda button: self.game.change_state('Pilote'))
+        self.on_click('Load', lambda button: print("Load"))  #load_menu()
+        self.on_click('Settings', lambda button: print("Settings"))  #self.game.change_state('Outro')
         
     def enter(self):
         # when the state becomes the current state, play the intro sound
         self.game.audio.play('intro')
 
+    def exit(self):
+        super().exit()
+        # free the large images, nothing shows them anymore
+        self.all_starfields.empty()
+        self.game.assets.release(*self.large_images)
+
     def update(self):
         # on every frame, call the update method of the base class
         super().update()
@@ -355,43 +544,51 @@ class Intro(State):
        # check if any key is pressed
         if self.game.input.is_mouse_pressed(1):
                 print("Mouse press")
-                mouse_pos = pg.mouse.get_pos()
-                # Check if the mouse click is within the region of Option 1
-                for button in self.all_buttons:
-                    if button.rect.collidepoint(mouse_pos) and button.tag == 'NewGame':
-                        self.game.change_state('Pilote')
-                        print("New Game")
-                    # Check for Option 2
-                    elif button.rect.collidepoint(mouse_pos) and button.tag == 'Load':
-                        #load_menu()
-                        print("Load")
-                    # Check for Option 3
-                    elif button.rect.collidepoint(mouse_pos) and button.tag == 'Settings':
-                        #self.game.change_state('Outro')
-                        print("Settings")
-        sf_speed = SCREEN_WIDTH/(60*5)
+                self.click(pg.mouse.get_pos())
+
+    def tick(self, dt):
+        # the starfield crosses the screen in 5 seconds
+        sf_speed = SCREEN_WIDTH/5
         for sf in self.all_starfields:
-            sf.rect.x -= sf_speed
-            if sf.rect.right < 0:
-                sf.rect.x += 4096
+            sf.prev_x = sf.x
+            sf.x -= sf_speed*dt
+            if sf.x + sf.rect.w < 0:
+                sf.x += 4096
+                sf.prev_x += 4096
+
+    def interpolate(self, alpha):
+        for sf in self.all_starfields:
+            sf.rect.x = round(sf.prev_x + (sf.x - sf.prev_x)*alpha)
         
 class Pilote(State):
     """
     Pilote game state
     """
     def boot(self):
-        self.game.memory.move_player(list(self.game.memory.Galaxy.stars.values())[0])
+        self.game.memory.move_player(self.game.memory.Galaxy.first_star())
         self.game.memory.set_home_system()
-        print(list(self.game.memory.Galaxy.stars.keys())[0])
+        print(self.game.memory.Player["System"].name)
+        # main menu
+        self.on_click('enter', lambda button: self.open_menu('system'))
+        self.on_click('travel', lambda button: self.game.change_state('Traveling'))
+        self.on_click('logs', lambda button: print("Logs"))
+        self.on_click('inventory', lambda button: self.game.change_state('Inventory'))
+        # system menu
+        for rank, tag in enumerate(('first', 'second', 'third', 'fourth')):
+            self.on_click(tag, lambda button, rank=rank: self.orbit(rank))
+        self.on_click('back', lambda button: self.open_menu('main'))
+        self.on_click('left', lambda button: self.open_menu('system', self.menu_obj - 4))
+        self.on_click('right', lambda button: self.open_menu('system', self.menu_obj + 4))
 
         
-    def enter(self):
+    def entering(self):
         # when the state becomes the current state
         #set the current submenu to main
         self.menu_state = 'main'
         self.menu_page = 0
         self.menu_obj = 0
-        self.draw_PiloteUI()
+        # the map is drawn over several frames
+        yield from self.building_PiloteUI()
         print('enter')
 
     def update(self):
@@ -404,43 +601,27 @@ class Pilote(State):
             print(self.menu_drawn)
             match self.menu_state:
                 case 'main':
-                   title_button = TextSprite(self.game,
-                    os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                    self.game.memory.Player["System"].name, 12, color = (255,255,255))
-                   size = (SCREEN_WIDTH*0.4*0.9,title_button.rect.h)
-                   title_button.make_button(size)
+                   title_button = self.menu_button('title', self.game.memory.Player["System"].name)
                    title_button.rect.centerx = 0.75*SCREEN_WIDTH
                    title_button.rect.top = 0.15*SCREEN_HEIGHT
                    self.all_buttons.add(title_button)     
                
-                   enter_button = TextSprite(self.game,
-                    os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                    "Enter system", 12, color = (255,255,255),tag='enter')
-                   enter_button.make_button(size)
+                   enter_button = self.menu_button('enter', "Enter system", tag='enter')
                    enter_button.rect.center = title_button.rect.center
                    enter_button.rect.centery += 0.175*SCREEN_HEIGHT
                    self.all_buttons.add(enter_button)
                
-                   travel_button = TextSprite(self.game,
-                    os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                    "Leave the system", 12, color = (255,255,255),tag='travel')
-                   travel_button.make_button(size)
+                   travel_button = self.menu_button('travel', "Leave the system", tag='travel')
                    travel_button.rect.center = title_button.rect.center
                    travel_button.rect.centery += 0.325*SCREEN_HEIGHT
                    self.all_buttons.add(travel_button)
                
-                   inventory_button = TextSprite(self.game,
-                    os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                    "Check inventory", 12, color = (255,255,255),tag='inventory')
-                   inventory_button.make_button(size)
+                   inventory_button = self.menu_button('inventory', "Check inventory", tag='inventory')
                    inventory_button.rect.center = title_button.rect.center
                    inventory_button.rect.centery += 0.475*SCREEN_HEIGHT
                    self.all_buttons.add(inventory_button) 
 
-                   logs_button = TextSprite(self.game,
-                    os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                    "Check logs", 12, color = (255,255,255),tag='logs')
-                   logs_button.make_button(size)
+                   logs_button = self.menu_button('logs', "Check logs", tag='logs')
                    logs_button.rect.center = title_button.rect.center
                    logs_button.rect.centery += 0.625*SCREEN_HEIGHT
                    self.all_buttons.add(logs_button)
@@ -449,56 +630,40 @@ class Pilote(State):
                
                 case 'system':
                     # Title button is not printed, but serves as an anchor and size reference for other sprites.
-                    title_button = TextSprite(self.game,
-                        os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                        self.game.memory.Player["System"].name, 12, color = (255,255,255))
-                    size = (SCREEN_WIDTH*0.4*0.9,title_button.rect.h)
-                    title_button.make_button(size)
+                    title_button = self.menu_button('title', self.game.memory.Player["System"].name)
                     title_button.rect.centerx = 0.75*SCREEN_WIDTH
                     title_button.rect.top = 0
                     
-                    Objects_list = self.game.memory.Galaxy.stars[self.game.memory.Player["System"].name].objects
+                    Objects_list = self.game.memory.Player["System"].objects
                     nbr_planets = len(Objects_list)
                     # You can only print 4 objects at a time                 
                     
-                    first_button = TextSprite(self.game,
-                        os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                        Objects_list[self.menu_obj].name, 12, color = (255,255,255),tag='first')
-                    first_button.make_button(size)
+                    first_button = self.menu_button('first', Objects_list[self.menu_obj].name, tag='first')
                     first_button.rect.center = title_button.rect.center
                     first_button.rect.centery += 0.175*SCREEN_HEIGHT
                     self.all_buttons.add(first_button)                                            
 
                     if nbr_planets >= 2+self.menu_obj:
-                        second_button = TextSprite(self.game,
-                            os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                            Objects_list[self.menu_obj +1].name, 12, color = (255,255,255),tag='second')
-                        second_button.make_button(size)
+                        second_button = self.menu_button('second', Objects_list[self.menu_obj +1].name, tag='second')
                         second_button.rect.center = title_button.rect.center
                         second_button.rect.centery += 0.325*SCREEN_HEIGHT
                         self.all_buttons.add(second_button)
                     
                     if nbr_planets >= 3+self.menu_obj:
-                        third_button = TextSprite(self.game,
-                            os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                            Objects_list[self.menu_obj +2].name, 12, color = (255,255,255),tag='third')
-                        third_button.make_button(size)
+                        third_button = self.menu_button('third', Objects_list[self.menu_obj +2].name, tag='third')
                         third_button.rect.center = title_button.rect.center
                         third_button.rect.centery += 0.475*SCREEN_HEIGHT
                         self.all_buttons.add(third_button) 
                     
                     if nbr_planets >= 4+self.menu_obj:
-                        fourth_button = TextSprite(self.game,
-                            os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                            Objects_list[self.menu_obj +3].name, 12, color = (255,255,255),tag='fourth')
-                        fourth_button.make_button(size)
+                        fourth_button = self.menu_button('fourth', Objects_list[self.menu_obj +3].name, tag='fourth')
                         fourth_button.rect.center = title_button.rect.center
                         fourth_button.rect.centery += 0.625*SCREEN_HEIGHT
                         self.all_buttons.add(fourth_button)
 
                     size_arrow = (title_button.rect.h,title_button.rect.h)
                     if self.menu_obj > 0:
-                        left_arrow = make_arrow(self.game, 'left', size_arrow)
+                        left_arrow = self.menu_arrow('left', size_arrow)
                         
                         left_arrow.rect.center = title_button.rect.center
                         left_arrow.rect.centery += 0.775*SCREEN_HEIGHT
@@ -507,7 +672,7 @@ class Pilote(State):
                         self.all_buttons.add(left_arrow)
                         
                     if self.menu_obj +3 < nbr_planets-1:
-                        right_arrow = make_arrow(self.game, 'right',size_arrow)
+                        right_arrow = self.menu_arrow('right', size_arrow)
                         
                         right_arrow.rect.center = title_button.rect.center
                         right_arrow.rect.centery += 0.775*SCREEN_HEIGHT
@@ -515,7 +680,7 @@ class Pilote(State):
 
                         self.all_buttons.add(right_arrow)   
 
-                    back_arrow = make_arrow(self.game, 'back',size_arrow)
+                    back_arrow = self.menu_arrow('back', size_arrow)
                         
                     back_arrow.rect.center = title_button.rect.center
                     back_arrow.rect.centery += 0.775*SCREEN_HEIGHT
@@ -529,72 +694,19 @@ class Pilote(State):
        # check if any key is pressed
         if self.game.input.is_mouse_pressed(1):
                 print("Mouse press")
-                mouse_pos = pg.mouse.get_pos()
-                # Check case
-                match self.menu_state:
-                    case 'main':
-                        for button in self.all_buttons:
-                            if button.rect.collidepoint(mouse_pos) and button.tag == 'enter':
-                                self.menu_state = 'system'
-                                self.all_buttons.empty()
-                                self.menu_drawn = False
-                            # Check for Option 2
-                            elif button.rect.collidepoint(mouse_pos) and button.tag == 'travel':
-                                print("Travel")
-                                self.game.change_state('Traveling')
-                            # Check for Option 3
-                            elif button.rect.collidepoint(mouse_pos) and button.tag == 'logs':
-                                print("Logs")    
-                            elif button.rect.collidepoint(mouse_pos) and button.tag == 'inventory':
-                                self.game.change_state('Inventory')
-                                print("Inventory")         
-
-                    case 'system':
-                        for button in self.all_buttons:
-                            Objects_list = self.game.memory.Galaxy.stars[self.game.memory.Player["System"].name].objects
-                            if button.rect.collidepoint(mouse_pos) and button.tag == 'first':
-                                print("first")
-                                self.game.memory.move_player(self.game.memory.Player["System"], obj = Objects_list[self.menu_obj])
-                                self.game.change_state('Surface')
-                                
-                            # Check for Option 2
-                            elif button.rect.collidepoint(mouse_pos) and button.tag == 'second':
-                                print("second")
-                                self.game.memory.move_player(self.game.memory.Player["System"], obj=Objects_list[self.menu_obj + 1])
-                                self.game.change_state('Surface')
-                                
-                            # Check for Option 3
-                            elif button.rect.collidepoint(mouse_pos) and button.tag == 'third':
-                                print("third")
-                                self.game.memory.move_player(
-                                    self.game.memory.Player["System"], obj=Objects_list[self.menu_obj + 2])
-                                self.game.change_state('Surface')
-                                
-                            elif button.rect.collidepoint(mouse_pos) and button.tag == 'fourth':
-                                #self.game.change_state('Outro')
-                                print("fourth")
-                                self.game.memory.move_player(
-                                    self.game.memory.Player["System"], obj=Objects_list[self.menu_obj + 3])
-                                self.game.change_state('Surface')
-                                
-                            elif button.rect.collidepoint(mouse_pos) and button.tag == 'back':
-                                print("Back")
-                                self.menu_state = 'main'
-                                self.all_buttons.empty()
-                                self.menu_obj = 0
-                                self.menu_drawn = False
-                                
-                            elif button.rect.collidepoint(mouse_pos) and button.tag == 'left':
-                                print("Left")
-                                self.all_buttons.empty()
-                                self.menu_drawn = False
-                                self.menu_obj -= 4
-                                
-                            elif button.rect.collidepoint(mouse_pos) and button.tag == 'right':
-                                print("right")
-                                self.all_buttons.empty()
-                                self.menu_drawn = False
-                                self.menu_obj += 4
+                self.click(pg.mouse.get_pos())
+
+    def open_menu(self, menu_state, menu_obj=0):
+        self.menu_state = menu_state
+        self.menu_obj = menu_obj
+        self.all_buttons.empty()
+        self.menu_drawn = False
+
+    def orbit(self, rank):
+        # go to the object at this rank among the ones on the page of the system menu
+        Objects_list = self.game.memory.Player["System"].objects
+        self.game.memory.move_player(self.game.memory.Player["System"], obj = Objects_list[self.menu_obj + rank])
+        self.game.change_state('Surface')
 
 class Surface(State):
     """
@@ -603,16 +715,26 @@ class Surface(State):
 
     def boot(self):
         print("Surface")
+        # main menu
+        self.on_click('build', lambda button: self.open_menu('build'))
+        self.on_click('leave', lambda button: self.game.change_state('Pilote'))
+        self.on_click('inventory', lambda button: self.game.change_state('Inventory'))
+        self.on_click('trade', lambda button: self.open_menu('trade'))
+        # scan menu
+        self.on_click('back', lambda button: self.open_menu('main'))
+        # the ressources over the highlight of the selected square
+        self.all_sprites.set_layer('map', 1)
 
 
-    def enter(self):
+    def entering(self):
         # when the state becomes the current state
         #set the current submenu to main
         self.menu_state = 'main'
         self.menu_square = 0
         self.selected_square = 0
+        self.click_grids.clear()
         print('surface')
-        self.draw_PiloteUI()
+        yield from self.building_PiloteUI()
         print(self.game.memory.Player["Object"].name)
         
     def update(self):
@@ -621,56 +743,32 @@ class Surface(State):
         assets_dir = ressource_path()
         obj = self.game.memory.Player["Object"]
         
-        pos_register = {'0': [3, 3], '1': [3, 4], '2': [4, 3], '3':[3, 2], '4': [2, 3],
-                        '5': [2, 4], '6': [4, 4], '7': [4, 2], '8': [2, 2], '9': [3, 5],
-                        '10': [5, 3], '11': [3, 1], '12': [1, 3], '13': [2, 5], '14': [4, 5],
-                        '15': [5, 4], '16':[5,2], '17':[4,1], '18':[2,1], '19':[1,2],
-                        '20':[1,4]}
        # check which menu is currently display
+        # (the left panel is kept, built when entering and when the menu changes)
         if self.menu_drawn == False:
-
-            square = obj.grid[self.selected_square]           
-
-            self.draw_PiloteUI()
             match self.menu_state:
                 case 'main':
                     # Title button is
-                    title_button = TextSprite(self.game,
-                        os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                        self.game.memory.Player["Object"].name, 12, color = (255,255,255))
-                    size = (SCREEN_WIDTH*0.4*0.9,title_button.rect.h)
-                    title_button.make_button(size)
+                    title_button = self.menu_button('title', self.game.memory.Player["Object"].name)
                     title_button.rect.centerx = 0.75*SCREEN_WIDTH
                     title_button.rect.top = 0.15*SCREEN_HEIGHT
-                    self.all_sprites.add(title_button)
+                    self.all_buttons.add(title_button)
                    
                     Checkboard = obj.grid
-                    build_button = TextSprite(self.game,
-                            os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                            "Scan surface", 12, color=(255, 255, 255),tag='build')
-                    build_button.make_button(size)
+                    build_button = self.menu_button('build', "Scan surface", tag='build')
                     build_button.rect.center = title_button.rect.center
                     build_button.rect.centery += 0.175*SCREEN_HEIGHT
                     
-                    leave_button = TextSprite(self.game,
-                        os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                        "Leave orbit", 12, color=(255, 255, 255),tag='leave')
-                    leave_button.make_button(size)
+                    leave_button = self.menu_button('leave', "Leave orbit", tag='leave')
                     leave_button.rect.center = title_button.rect.center
                     leave_button.rect.centery += 0.325*SCREEN_HEIGHT
                     
-                    inventory_button = TextSprite(self.game,
-                        os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                        "Inventory", 12, color=(255, 255, 255),tag='inventory')
-                    inventory_button.make_button(size)
+                    inventory_button = self.menu_button('inventory', "Inventory", tag='inventory')
                     inventory_button.rect.center = title_button.rect.center
                     inventory_button.rect.centery += 0.475*SCREEN_HEIGHT
 
                     if obj.populated == True:
-                        trade_button = TextSprite(self.game,
-                            os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                            "Trade", 12, color=(255, 255, 255),tag='trade')
-                        trade_button.make_button(size)
+                        trade_button = self.menu_button('trade', "Trade", tag='trade')
                         trade_button.rect.center = title_button.rect.center
                         trade_button.rect.centery += 0.175*SCREEN_HEIGHT
                         build_button.rect.centery += 0.150*SCREEN_HEIGHT
@@ -684,17 +782,13 @@ class Surface(State):
 
                 case 'build':
                      # Title button is
-                    title_button = TextSprite(self.game,
-                        os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                        self.game.memory.Player["Object"].name, 12, color = (255,255,255))
-                    size = (SCREEN_WIDTH*0.4*0.9,title_button.rect.h)
-                    title_button.make_button(size)
+                    title_button = self.menu_button('title', self.game.memory.Player["Object"].name)
                     title_button.rect.centerx = 0.75*SCREEN_WIDTH
                     title_button.rect.top = 0.15*SCREEN_HEIGHT
-                    self.all_sprites.add(title_button)
+                    self.all_buttons.add(title_button)
                     
                     size_arrow = (title_button.rect.h,title_button.rect.h)
-                    back_arrow = make_arrow(self.game, 'back',size_arrow)   
+                    back_arrow = self.menu_arrow('back', size_arrow)   
                     back_arrow.rect.center = title_button.rect.center
                     back_arrow.rect.centery += 0.65*SCREEN_HEIGHT
                     back_arrow.rect.centerx -= 0.5*SCREEN_WIDTH
@@ -704,89 +798,77 @@ class Surface(State):
        # check if any key is pressed
         if self.game.input.is_mouse_pressed(1):
             print("Mouse press")
-            mouse_pos = pg.mouse.get_pos()
-            if self.menu_state == 'main':
-                # Check if the mouse click is within the region of Option 1
-                for button in self.all_buttons:
-                    if button.rect.collidepoint(mouse_pos) and button.tag == 'build':
-                        self.menu_state = 'build'
-                        self.menu_drawn = False
-                        self.all_buttons.empty()
-                        print("Scan surface")
-                    # Check for Option 2
-                    elif button.rect.collidepoint(mouse_pos) and button.tag == 'leave':
-                        print("Leave orbit")
-                        self.game.change_state('Pilote')
-                    # Check for Option 3
-                    elif button.rect.collidepoint(mouse_pos) and button.tag == 'inventory':
-                        self.game.change_state('Inventory')
-                    elif button.rect.collidepoint(mouse_pos) and button.tag == 'trade':
-                        self.menu_state = 'trade'
-                        self.menu_drawn = False
-                        self.all_buttons.empty()
-                        print("Trade")
-
-            if self.menu_state == 'build':
-                for sprite in self.all_sprites:
-                        if sprite.tag in range(31) and sprite.rect.collidepoint(mouse_pos):
-                            self.menu_drawn = False
-                            pair = [int(sprite.tag)%5, int(sprite.tag) // 5]
-                            if pair[0] == 0:
-                                    pair[0] = 5
-                                    pair[1] -= 1
-                            key = [key for key, value in pos_register.items() if value == pair][0]
-                            self.selected_square = int(key)
-                            print(key)
-                            
-                for sprite in self.all_buttons:
-                        if sprite.tag == 'back' and sprite.rect.collidepoint(mouse_pos):
-                            self.menu_drawn = False
-                            print('back')
-                            self.menu_state = 'main'
-                            for spr in self.all_sprites:
-                                if spr.tag in range(31) or spr.tag == 'activated' or spr.tag == 'map':
-                                    self.all_sprites.remove(spr)
-                            self.all_buttons.empty()
+            self.click(pg.mouse.get_pos())
+
+    def open_menu(self, menu_state):
+        self.menu_state = menu_state
+        self.menu_drawn = False
+        self.all_buttons.empty()
+        if menu_state == 'main':
+            # leave the scan: remove the squares and the grid
+            self.all_sprites.remove_tags(*range(31), 'activated', 'map')
+            self.click_grids.pop('surface', None)
+        elif menu_state == 'build' and 'surface' not in self.click_grids:
+            # scan: the squares of the surface over the planet
+            self.draw_surface_content(self.map_bg)
+
+    def select_square(self, x, y):
+        key = SQUARE_AT.get((x + 1, y + 1))
+        if key is not None and key < len(self.game.memory.Player["Object"].grid):
+            self.selected_square = key
+            self.highlight_square()
+            print(key)
 
 class Traveling(State):
     """
     Traveling state
     """
-    def enter(self):
+    animated = True  # the events are rolled every frame
+
+    def entering(self):
         self.Event = Event(self.game)
-        self.draw_PiloteUI()
+        self.text_offset = 0
+        yield from self.building_PiloteUI()
         print('Traveling')
 
         
     def display_event(self,surface):
         assets_dir = ressource_path()
         surface.image.fill("black")
-        font = pg.font.Font(os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'), 14)
-        blit_text(surface.image, self.Event.description, surface.rect.topleft, font, color=pg.Color('white'))
+        surface.dirty = 1  # drawn in place
+        atlas = GlyphAtlas.get(os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'), 14, 'white')
+        # the layout is cached, scrolling only blits another part of it
+        layout = blit_text(surface.image, self.Event.description, surface.rect.topleft, atlas, self.text_offset)
+        self.text_offset = min(self.text_offset, layout.max_offset(surface.rect.h - surface.rect.top))
         self.all_buttons.add(surface)
         #print("Hello ?")
         
-    def update(self):
-        super().update()
+    def tick(self, dt):
         if self.Event.number == 0:
-            diceroll = random.randrange(0,199000)+1000
-            #print("dice roll",diceroll)
-            #print("timer", pg.time.get_ticks() - self.Event.LastEvent)
-            if diceroll <= (pg.time.get_ticks() - self.Event.LastEvent):
+            self.Event.elapsed += dt*1000
+            # the odds of the former roll of a dice every 1/60 s, for any tick rate
+            odds = max(0, self.Event.elapsed - 1000 + 1)/199000
+            if random.random() < 1 - (1 - min(odds, 1))**(dt*60):
                 self.selectEvent()
                 self.menu_drawn = False
 
+    def update(self):
+        super().update()
+
+        # scroll the event description with the mouse wheel
+        scroll = self.game.input.is_mouse_pressed(5) - self.game.input.is_mouse_pressed(4)
+        if scroll and self.Event.number != 0:
+            self.text_offset = max(0, self.text_offset + scroll)
+            for sprite in self.all_sprites.tagged("map"):
+                self.display_event(sprite)
+
         assets_dir = ressource_path()
         
        # check which menu is currently display
         if self.menu_drawn == False:
             print(self.menu_drawn)
-            title_button = TextSprite(self.game,
-                    os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                    self.game.memory.Player["System"].name, 12, color = (255,255,255))
+            title_button = self.menu_button('title', self.game.memory.Player["System"].name)
                     #self.game.memory.Player["System"].name + "-->" + self.game.memory.Player["Destination"].name, 12, color = (255,255,255))
-            size = (SCREEN_WIDTH*0.4*0.9,title_button.rect.h)
-            title_button.make_button(size)
             title_button.rect.centerx = 0.75*SCREEN_WIDTH
             title_button.rect.top = 0.15*SCREEN_HEIGHT
             self.all_buttons.add(title_button)     
@@ -794,10 +876,8 @@ class Traveling(State):
             self.button_pos = 0
             if self.Event.number != 0:
                 for key,value in self.Event.choice.items():
-                    button = TextSprite(self.game,
-                        os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                        key, 12, color = (255,255,255),tag=value)
-                    button.make_button(size)
+                    button = self.menu_button(('choice', self.button_pos), key, tag=value)
+                    self.on_click(value, self.choose)
                     button.rect.center = title_button.rect.center
                     button.rect.centery += (0.175+0.150*self.button_pos)*SCREEN_HEIGHT
                     self.all_buttons.add(button)
@@ -808,16 +888,14 @@ class Traveling(State):
        # check if any key is pressed
         if self.game.input.is_mouse_pressed(1):
             print("Mouse press")
-            mouse_pos = pg.mouse.get_pos()
-            # Check if the mouse click is within the region of Option 1
-            for button in self.all_buttons:
-                for key, value in self.Event.choice.items():
-                    if button.rect.collidepoint(mouse_pos) and button.tag == value:
-                        self.Event.reference = value
-                        self.menu_drawn = False
-                        self.all_buttons.empty()
-                        self.selectEvent()
-                        print(value)
+            self.click(pg.mouse.get_pos())
+
+    def choose(self, button):
+        self.Event.reference = button.tag
+        self.menu_drawn = False
+        self.all_buttons.empty()
+        self.selectEvent()
+        print(button.tag)
            
             
     def selectEvent(self,event = ""):
@@ -825,23 +903,26 @@ class Traveling(State):
             self.Event.number = random.randint(1,self.Event.Count)
         
         self.Event.load_event()
+        self.text_offset = 0
         print(self.Event.description)
         print("What ?")
-        for sprite in self.all_sprites:
-           if sprite.tag == "map":
-               self.display_event(sprite)
+        for sprite in self.all_sprites.tagged("map"):
+            self.display_event(sprite)
     
 class Inventory(State):
     """
     Inventory state
     """
-    def enter(self):
+    def boot(self):
+        self.on_click('back', lambda button: self.game.change_state('Pilote'))
+
+    def entering(self):
         # when the state becomes the current state
         self.menu_state = 'main'
         self.inventory_page = 0
         self.menu_square = 0
-        self.draw_PiloteUI()
         self.inv_slot = [0,0]
+        yield from self.building_PiloteUI()
         print('inventory')
         
     def update(self):
@@ -857,11 +938,7 @@ class Inventory(State):
                 case 'main':
                     # Check what is the selected item
                     text = Inventory[self.inventory_page][self.inv_slot[1]][self.inv_slot[0]].name
-                    title_button = TextSprite(self.game,
-                        os.path.join(assets_dir, 'fonts', 'PressStart2P-Regular.ttf'),
-                        text, 12, color = (255,255,255))
-                    size = (SCREEN_WIDTH*0.4*0.9,title_button.rect.h)
-                    title_button.make_button(size)
+                    title_button = self.menu_button('title', text)
                     title_button.rect.centerx = 0.75*SCREEN_WIDTH
                     title_button.rect.top = 0.15*SCREEN_HEIGHT
                     
@@ -869,7 +946,7 @@ class Inventory(State):
                     
                     size_arrow = (title_button.rect.h,title_button.rect.h)
                     if self.inventory_page > 0:
-                        left_arrow = make_arrow(self.game, 'left', size_arrow)
+                        left_arrow = self.menu_arrow('left', size_arrow)
                         
                         left_arrow.rect.center = title_button.rect.center
                         left_arrow.rect.centery += 0.65*SCREEN_HEIGHT
@@ -879,14 +956,14 @@ class Inventory(State):
                         
                     if self.inventory_page < len(Inventory)-1:
                         print(len(Inventory))
-                        right_arrow = make_arrow(self.game, 'right',size_arrow)
+                        right_arrow = self.menu_arrow('right', size_arrow)
                         right_arrow.rect.center = title_button.rect.center
                         right_arrow.rect.centery += 0.65*SCREEN_HEIGHT
                         right_arrow.rect.centerx -= 0.375*SCREEN_WIDTH
 
                         self.all_buttons.add(right_arrow)   
 
-                    back_arrow = make_arrow(self.game, 'back',size_arrow)   
+                    back_arrow = self.menu_arrow('back', size_arrow)   
                     back_arrow.rect.center = title_button.rect.center
                     back_arrow.rect.centery += 0.65*SCREEN_HEIGHT
                     back_arrow.rect.centerx -= 0.5*SCREEN_WIDTH
@@ -910,23 +987,18 @@ class Inventory(State):
                 self.menu_drawn = False
         
         if self.game.input.is_mouse_pressed(1):
-            pos = pg.mouse.get_pos()
-            for sprite in self.all_sprites:
-                if sprite.tag in range(0, 42) and sprite.rect.collidepoint(pos):
-                    self.menu_drawn = False
-                    self.inv_slot = [sprite.tag % 6, sprite.tag//6]
-            for sprite in self.all_buttons:
-                if sprite.tag == 'back' and sprite.rect.collidepoint(pos):
-                    self.menu_drawn = False
-                    print('back')
-                    self.game.change_state('Pilote')
+            self.click(pg.mouse.get_pos())
+
+    def select_slot(self, x, y):
+        self.inv_slot = [x, y]
+        self.menu_drawn = False
                     
 
             
 
 class Loading(State):
     """
-    Loading screen state (Unused yet)
+    Loading screen state, shown while the game changes state, with the progress of the change
     """
     def boot(self):
         assets_dir = ressource_path()
@@ -938,6 +1010,27 @@ class Loading(State):
         text.rect.center = self.game.screen.get_rect().center
         # add the text to the all_sprites group
         self.all_sprites.add(text)
+        # the progress bar under the text
+        self.bar = ShapeSprite(self.game, "rect", color = (0,0,0,0), size = (SCREEN_WIDTH*0.4, 12), tag='progress')
+        self.bar.rect.midtop = (text.rect.centerx, text.rect.bottom + 24)
+        self.all_sprites.add(self.bar)
+        self.progress = None
+        self.set_progress(0)
+
+    def set_progress(self, progress):
+        """
+        Show the progress of the change of state on the bar
+
+        progress: from 0 to 1
+        """
+        width = round(self.bar.rect.w*progress)
+        if width == self.progress:
+            return
+        self.progress = width
+        self.bar.image.fill((0,0,0,0))
+        self.bar.image.fill((255,255,255), (0, 0, width, self.bar.rect.h))
+        pg.draw.rect(self.bar.image, (255,255,255), self.bar.image.get_rect(), 1)
+        self.bar.dirty = 1  # drawn in place
 
 # add the states to the __all__ list
 # this is needed so that the states can be imported using the * syntax